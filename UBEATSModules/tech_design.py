@@ -22,7 +22,6 @@ You should have received a copy of the GNU General Public License
 along with this program; if not, write to the Free Software
 Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """
-import math as m
 import numpy as np
 import tech_designbydcv as ddcv
 import tech_templates as tt
@@ -31,6 +30,51 @@ import tech_templates as tt
 #DESIGN FUNCTIONS FOR DIFFERENT TECHNOLOGIES           #
 ########################################################
 
+def getDesignTargets(targets, tech_apps):
+    """Returns the target vector used to size a system on its design curve for the given applications
+    [runoff, pollution, recycling]: [tarQ, tarTSS, tarTP, tarTN, tarGP]"""
+    tarQ, tarTSS, tarTP, tarTN = targets[0:4]
+    tarQ *= tech_apps[0]
+    tarTSS *= tech_apps[1]
+    tarTP *= tech_apps[1]
+    tarTN *= tech_apps[1]
+    return [tarQ, tarTSS, tarTP, tarTN, 100]
+
+def designDCVArray(systype, Aimp, dcv, targets, tech_apps, soilK, systemK, minsize, maxsize):
+    """Sizes systems that are designed with design curves for an array of impervious areas to treat, e.g. one per
+    design increment. soilK can be a single value or an array of the same length as Aimp.
+    Returns the array of system areas before planning constraints [sqm], np.nan where a system cannot be designed,
+    i.e. no impervious area, targets cannot be met on the curve or the system exceeds the maximum size.
+    """
+    designtargets = getDesignTargets(targets, tech_apps)
+    Aimp, soilK = np.broadcast_arrays(np.atleast_1d(np.asarray(Aimp, dtype=float)), np.asarray(soilK, dtype=float))
+    exfil = np.minimum(soilK, systemK)
+    psystem = np.empty(Aimp.shape)
+    psystem.fill(np.inf)                #no infiltration into the soil, cannot be designed
+    for k in np.unique(exfil[soilK != 0]):
+        psystem[(exfil == k) & (soilK != 0)] = ddcv.retrieveDesignCached(dcv, systype, k, designtargets)
+
+    with np.errstate(invalid='ignore'):
+        system_area = np.maximum(Aimp * psystem, minsize)  #the larger of the two
+        impossible = (Aimp == 0) | np.isinf(psystem) | (psystem == 0) | (system_area > maxsize)
+    system_area[impossible] = np.nan
+    return system_area
+
+def addPlanningArea(system_area, Areq):
+    """Returns the arrays of required planning areas [sqm] and area factors (1 where no system is possible)"""
+    with np.errstate(invalid='ignore'):
+        diff = Areq / system_area
+    diff[np.isnan(Areq)] = 1
+    return Areq, diff
+
+def getDesignFromArray(design, index):
+    """Returns element 'index' of the output of an array design function as a [Areq, area factor] pair, with
+    Areq = None if the system cannot be designed"""
+    Areq, diff = design
+    if np.isnan(Areq[index]):
+        return [None, 1]
+    return [float(Areq[index]), float(diff[index])]
+
 #---BIOFILTRATION SYSTEM/RAINGARDEN [BF]----------------------------------------
 def design_BF(Aimp, dcv, targets, tech_apps, soilK, systemK, minsize, maxsize):
     #Design of Biofiltration systems
@@ -41,48 +85,19 @@ def design_BF(Aimp, dcv, targets, tech_apps, soilK, systemK, minsize, maxsize):
     #          tarTN = TN reduction target
     #          soilK = soil hydraulic conductivity
     #          maxsize = maximum allowable system size
-    tarQ, tarTSS, tarTP, tarTN = targets[0:4]
-    tarQ *= tech_apps[0]
-    tarTSS *= tech_apps[1]
-    tarTP *= tech_apps[1]
-    tarTN *= tech_apps[1]
-    
-    exfil = min(soilK, systemK)
-    #print Aimp, tarTSS, tarTP, tarTN, exfil
-    if Aimp == 0:   #if there is no impervious area to design for, why bother?
-        return [None, 1]
-    #size the system for runoff reduction and pollution reduction independently
-    if soilK != 0:
-        psystem = ddcv.retrieveDesign(dcv, "BF", exfil, [tarQ, tarTSS, tarTP, tarTN, 100])
-    else:
-        psystem = np.inf
-        
-    if psystem == np.inf or psystem == 0:
-        return [None, 1]
-    
-    system_area = max(Aimp * psystem, minsize)  #the larger of the two
-    
-    #if the system design has passed to this point: i.e. not impossible and there is impervious to treat, then add planning constraints
-    
-    if system_area > maxsize:          #if the final design exceeds the maximum allowable size, forget it!
-        #print "Warning, Maximum System Size Exceeded"
-        return [None, 1]
-        
-    #an infiltrating system (extra space around it required), determine the setback required
-    if soilK > 180:
-        setback = 1.0   #metres
-    elif soilK > 36:
-        setback = 2.0   #metres
-    elif soilK > 3.6:
-        setback = 4.0   #metres
-    else:
-        setback = 5.0   #metres
-    
-    Areq = m.pow((m.sqrt(system_area)+2*setback),2)
-    #print "Arequired", Areq
-    diff = Areq/system_area
-    #final check, if the system has exceeded maximum size, return 'impossible' = inf
-    return [Areq, diff]
+    return getDesignFromArray(designArray_BF(Aimp, dcv, targets, tech_apps, soilK, systemK, minsize, maxsize), 0)
+
+def designArray_BF(Aimp, dcv, targets, tech_apps, soilK, systemK, minsize, maxsize):
+    """Design of Biofiltration systems for an array of impervious areas, see designDCVArray(). Returns the arrays
+    of required planning areas [sqm] (np.nan if impossible) and area factors."""
+    system_area = designDCVArray("BF", Aimp, dcv, targets, tech_apps, soilK, systemK, minsize, maxsize)
+
+    #an infiltrating system (extra space around it required), determine the setback required [metres]
+    soilK = np.asarray(soilK, dtype=float)
+    setback = np.select([soilK > 180, soilK > 36, soilK > 3.6], [1.0, 2.0, 4.0], 5.0)
+
+    Areq = np.power(np.sqrt(system_area)+2*setback, 2)
+    return addPlanningArea(system_area, Areq)
 
 #---INFILTRATION SYSTEMS [IS]---------------------------------------------------
 def design_IS(Aimp, dcv, targets, tech_apps, soilK, systemK, minsize, maxsize):
@@ -94,55 +109,19 @@ def design_IS(Aimp, dcv, targets, tech_apps, soilK, systemK, minsize, maxsize):
     #          tarTN = TN reduction target
     #          soilK = soil hydraulic conductivity
     #          maxsize = maximum allowable system size
-    tarQ, tarTSS, tarTP, tarTN = targets[0:4]
-    tarQ *= tech_apps[0]
-    tarTSS *= tech_apps[1]
-    tarTP *= tech_apps[1]
-    tarTN *= tech_apps[1]
-    
-    exfil = min(soilK, systemK)
-    
-    if Aimp == 0:   #if there is no impervious area to design for, why bother?
-        return [None, 1]
-    
-    #size the system
-    if soilK != 0:
-        psystem = ddcv.retrieveDesign(dcv, "IS", exfil, [tarQ, tarTSS, tarTP, tarTN, 100])
-        #print psystem
-    else:
-        psystem = np.inf
-        
-    if psystem == np.inf or psystem == 0:       #if the system cannot be designed, it will return infinity
-        return [None, 1]
-    
-    system_area = max(Aimp * psystem, minsize)  #the larger of the two
-    
-    if system_area > maxsize:          #if the final design exceeds the maximum allowable size, forget it!
-        #print "Warning, Maximum System Size Exceeded"
-        return [None, 1]
-    
-    #if the system design has passed to this point: i.e. not impossible and there is impervious to treat, then add planning constraints
-    #find setback requirement based on soilK
-    if soilK >= 3600:
-        setback = 1.0
-    elif soilK >= 1800:
-        setback = 1.0
-    elif soilK >= 360:
-        setback = 1.0
-    elif soilK >= 180:
-        setback = 1.0
-    elif soilK > 36:
-        setback = 2
-    elif soilK > 3.6:
-        setback = 4.0   #metres
-    else:
-        #print "Soil is unsuitable for infiltration"
-        return [None, 1]
+    return getDesignFromArray(designArray_IS(Aimp, dcv, targets, tech_apps, soilK, systemK, minsize, maxsize), 0)
 
-    Areq = m.pow((m.sqrt(system_area)+2*setback),2)
-#    print "Required Area: ", Areq
-    diff = Areq/system_area
-    return [Areq, diff]
+def designArray_IS(Aimp, dcv, targets, tech_apps, soilK, systemK, minsize, maxsize):
+    """Design of Infiltration systems for an array of impervious areas, see designDCVArray(). Returns the arrays
+    of required planning areas [sqm] (np.nan if impossible) and area factors."""
+    system_area = designDCVArray("IS", Aimp, dcv, targets, tech_apps, soilK, systemK, minsize, maxsize)
+
+    #find setback requirement based on soilK [metres], soils of 3.6mm/hr and less are unsuitable for infiltration
+    soilK = np.asarray(soilK, dtype=float)
+    setback = np.select([soilK >= 180, soilK > 36, soilK > 3.6], [1.0, 2.0, 4.0], np.nan)
+
+    Areq = np.power(np.sqrt(system_area)+2*setback, 2)
+    return addPlanningArea(system_area, Areq)
 
 #---PONDS & BASINS [PB]---------------------------------------------------------
 def design_PB(Aimp, dcv, targets, tech_apps, soilK, systemK, minsize, maxsize ):
@@ -154,37 +133,18 @@ def design_PB(Aimp, dcv, targets, tech_apps, soilK, systemK, minsize, maxsize ):
     #          tarTN = TN reduction target
     #          soilK = soil hydraulic conductivity
     #          maxsize = maximum allowable system size
-    tarQ, tarTSS, tarTP, tarTN = targets[0:4]
-    tarQ *= tech_apps[0]
-    tarTSS *= tech_apps[1]
-    tarTP *= tech_apps[1]
-    tarTN *= tech_apps[1]
-    
-    exfil = min(soilK, systemK)
-    
-    if Aimp == 0:   #if there is no impervious area to design for, why bother?
-        return [None, 1]
-    #size the system
-    if soilK != 0:
-        psystem = ddcv.retrieveDesign(dcv, "PB", exfil, [tarQ, tarTSS, tarTP, tarTN, 100])
-    else:
-        psystem = np.inf
-        
-    if psystem == np.inf or psystem == 0:       #if the system cannot be designed, it will return infinity
-        return [None, 1]
-    
-    system_area = max(Aimp * psystem, minsize)  #the larger of the two
-    
-    if system_area > maxsize:          #if the final design exceeds the maximum allowable size, forget it!
-        #print "Warning, Maximum System Size Exceeded"
-        return [None, 1]
-    
+    return getDesignFromArray(designArray_PB(Aimp, dcv, targets, tech_apps, soilK, systemK, minsize, maxsize), 0)
+
+def designArray_PB(Aimp, dcv, targets, tech_apps, soilK, systemK, minsize, maxsize):
+    """Design of Ponds & Basins for an array of impervious areas, see designDCVArray(). Returns the arrays of
+    required planning areas [sqm] (np.nan if impossible) and area factors."""
+    system_area = designDCVArray("PB", Aimp, dcv, targets, tech_apps, soilK, systemK, minsize, maxsize)
+
     #add extra area to the system (multipliers for batters)
     batter_multiplier = 1.3
-    
+
     Areq = system_area * batter_multiplier
-    diff = Areq/system_area
-    return [Areq, diff]
+    return addPlanningArea(system_area, Areq)
 
 def sizeStoreArea_PB(vol, sysdepth, minsize, maxsize):
     surfarea = vol / sysdepth       #[sqm]
@@ -209,38 +169,18 @@ def design_WSUR(Aimp, dcv, targets, tech_apps, soilK, systemK, minsize, maxsize
     #          tarTN = TN reduction target
     #          soilK = soil hydraulic conductivity
     #          maxsize = maximum allowable system size
-    tarQ, tarTSS, tarTP, tarTN = targets[0:4]
-    tarQ *= tech_apps[0]
-    tarTSS *= tech_apps[1]
-    tarTP *= tech_apps[1]
-    tarTN *= tech_apps[1]
-    
-    exfil = min(soilK, systemK)
-    
-    if Aimp == 0:   #if there is no impervious area to design for, why bother?
-        return [None, 1]
-    #size the system
-    if soilK != 0:
-        psystem = ddcv.retrieveDesign(dcv, "WSUR", exfil, [tarQ, tarTSS, tarTP, tarTN, 100])
-    else:
-        psystem = np.inf    
-    
-    if psystem == np.inf or psystem == 0:       #if the system cannot be designed, it will return infinity
-        return [None, 1]
-    
-    system_area = max(Aimp * psystem, minsize)  #the larger of the two
-       
-    if system_area > maxsize:   #if the final design exceeds the maximum allowable size, forget it!
-        #print "Warning, Maximum System Size Exceeded"
-        return [None, 1]
-    
+    return getDesignFromArray(designArray_WSUR(Aimp, dcv, targets, tech_apps, soilK, systemK, minsize, maxsize), 0)
+
+def designArray_WSUR(Aimp, dcv, targets, tech_apps, soilK, systemK, minsize, maxsize):
+    """Design of Surface Wetlands for an array of impervious areas, see designDCVArray(). Returns the arrays of
+    required planning areas [sqm] (np.nan if impossible) and area factors."""
+    system_area = designDCVArray("WSUR", Aimp, dcv, targets, tech_apps, soilK, systemK, minsize, maxsize)
+
     #add extra area to the system (multipliers for batters)
     batter_multiplier = 1.3
-    
+
     Areq = system_area * batter_multiplier
-    diff = Areq/system_area
-    
-    return [Areq, diff]
+    return addPlanningArea(system_area, Areq)
 
 def sizeStoreArea_WSUR(vol, sysdepth, minsize, maxsize):
     surfarea = vol / sysdepth       #[sqm]
@@ -265,14 +205,34 @@ def design_SW(Aimp, dcv, targets, tech_apps, soilK, systemK, minsize, maxsize ):
     #          tarTN = TN reduction target
     #          soilK = soil hydraulic conductivity
     #          maxsize = maximum allowable system size
+    return getDesignFromArray(designArray_SW(Aimp, dcv, targets, tech_apps, soilK, systemK, minsize, maxsize), 0)
+
+def designArray_SW(Aimp, dcv, targets, tech_apps, soilK, systemK, minsize, maxsize):
+    """Design of Swales & Buffer Strips for an array of impervious areas. Returns the arrays of required planning
+    areas [sqm] (np.nan if impossible) and area factors."""
+    Aimp = np.atleast_1d(np.asarray(Aimp, dtype=float))
+    size_req = retrieveSizeSW(targets, tech_apps)
+
+    #calculate surface area of system required
+    if size_req == None:
+        Areq = np.empty(Aimp.shape)
+        Areq.fill(np.nan)
+    else:
+        Areq = np.maximum(Aimp * size_req/100, minsize)   #swales drain into a pipe, so no additional area required,
+                                                        #just need to check what minimum allowable width is
+        #NOTE: the maximum size is currently not enforced for swales
+        Areq[Aimp == 0] = np.nan   #no area - no system
+    return Areq, np.ones(Aimp.shape)
+
+def retrieveSizeSW(targets, tech_apps):
+    """Returns the size of swales & buffer strips required to meet the TSS, TP and TN targets [% of imp. area] or
+    None if the targets cannot be met with current design standards"""
     tarQ, tarTSS, tarTP, tarTN = targets[0:4]
     tarQ *= tech_apps[0]
     tarTSS *= tech_apps[1]
     tarTP *= tech_apps[1]
     tarTN *= tech_apps[1]
-    
-    exfil = min(soilK, systemK)
-    
+
     dcSW = [[0,0.1,0.2,0.5,1.0,1.5,2,2.5,3], \
             [0,50,70,81,89,90,91,91.5,92], \
             [0,30,45,55,60,62,64,65,65], \
@@ -304,28 +264,9 @@ def design_SW(Aimp, dcv, targets, tech_apps, soilK, systemK, minsize, maxsize ):
                 sizes.append(dcSW[0][up_row-1]+(slope*(targets[pol_index-1] - lower_bound)))    
                 break
     
-    #calculate surface area of system required
     if cannot_meet == 1:
-        return [None, 1]
-    else:
-        size_req = max(sizes)
-        Asystem = max(Aimp * size_req/100, minsize)
-    
-    if Asystem > maxsize:          #if the final design exceeds the maximum allowable size, forget it!
-        #print "Warning, Maximum System Size Exceeded"
-        Areq = None
-    
-    #add extra area to the system
-    
-    if Aimp == 0:
-        Areq = None
-        #print "no area - no system"
-    else:
-        Areq = Asystem      #swales drain into a pipe, so no additional area required, just need to check what minimum allowable width is
-
-    diff = 1.0
-    
-    return [Areq, diff]
+        return None
+    return max(sizes)
 
 #---RAINWATER/STORMWATAER TANK [RT]-------------------------------------------------
 def sizeStoreArea_RT(vol, sysdepth, minsize, maxsize):
@@ -341,4 +282,16 @@ def sizeStoreArea_RT(vol, sysdepth, minsize, maxsize):
     
     return [Areq, 1]    #No buffer for raintanks
         
-    
\ No newline at end of file
+    
+
+########################################################
+#DISPATCH TABLES                                       #
+########################################################
+
+#Array design functions by technology abbreviation, all take (Aimp, dcv, targets, tech_apps, soilK, systemK,
+#minsize, maxsize) and return the arrays of required planning areas and area factors
+DESIGN_FUNCTIONS = {"BF": designArray_BF, "IS": designArray_IS, "PB": designArray_PB, "WSUR": designArray_WSUR,
+                    "SW": designArray_SW}
+
+#Functions sizing the area of a store by technology abbreviation, all take (vol, sysdepth, minsize, maxsize)
+STORE_AREA_FUNCTIONS = {"RT": sizeStoreArea_RT, "PB": sizeStoreArea_PB, "WSUR": sizeStoreArea_WSUR}
@@ -23,9 +23,262 @@ along with this program; if not, write to the Free Software
 Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """
 
+import os, re, json, struct, collections
 import numpy as np
 import tech_templates as tt
 
+### ------------------------------------------------------------------------ ###
+###     DESIGN CURVE CACHE                                                   ###
+### ------------------------------------------------------------------------ ###
+
+DCV_CACHE = {}                              #Parsed design curves {normalised path : [source, mtime, DesignCurve]}
+DCV_CACHE_STATS = {"hits": 0, "misses": 0}  #Tracks how often the cache avoided re-reading a .dcv file
+DCV_BUNDLES = {}                            #Bundles looked up so far {curve directory : bundle mtime or None}
+DCV_BUNDLE_NAME = "wsudcurves.dcvb"         #Name of the compiled bundle inside a wsudcurves/<city> directory
+DCV_BUNDLE_MAGIC = "UBDCVB01"
+
+def getDesignCurve(pathfname):
+    """Returns the DesignCurve stored in the .dcv file 'pathfname'. Each file is only parsed once per process and
+    the result, including its exfiltration index, is held in DCV_CACHE. The cached curve is re-parsed if the file's
+    modification time has changed since it was last read. If the curve's directory contains a compiled bundle (see
+    compileDCVBundle()), all of its curves are memory-mapped from the bundle instead of reading the text files.
+    """
+    key = os.path.normpath(pathfname)
+    entry = DCV_CACHE.get(key)
+    if entry is not None and os.path.getmtime(entry[0]) == entry[1]:
+        DCV_CACHE_STATS["hits"] += 1
+        return entry[2]
+
+    DCV_CACHE_STATS["misses"] += 1
+    DCV_CACHE.pop(key, None)        #drop a curve whose file has changed since it was cached
+    if loadDCVBundle(os.path.join(os.path.dirname(key), DCV_BUNDLE_NAME)) and key in DCV_CACHE:
+        return DCV_CACHE[key][2]
+
+    mtime = os.path.getmtime(key)
+    data = np.loadtxt(key, delimiter=',', skiprows=1, usecols=range(7), ndmin=2)     #skip the header line
+    curve = DesignCurve(data.T)
+    DCV_CACHE[key] = [key, mtime, curve]
+    return curve
+
+def getDCVCacheStats():
+    """Returns the hit/miss counts of the design curve cache and the number of curves currently held."""
+    return {"hits": DCV_CACHE_STATS["hits"], "misses": DCV_CACHE_STATS["misses"], "curves": len(DCV_CACHE)}
+
+def clearDCVCache():
+    """Empties the design curve cache and resets its statistics."""
+    DCV_CACHE.clear()
+    DCV_BUNDLES.clear()
+    DCV_CACHE_STATS["hits"] = 0
+    DCV_CACHE_STATS["misses"] = 0
+    return True
+
+DCV_FILENAME_PATTERN = re.compile(r"^(?P<Type>[A-Z]+)(-EDD(?P<EDD>[0-9.]+)m)?(-FD(?P<FD>[0-9.]+)m)?"
+                                  r"(-MD(?P<MD>[0-9.]+)m)?-DC\.dcv$")
+
+def parseDCVFilename(filename):
+    """Retrieves the system type and specifications from the name of a UrbanBEATS design curve file, e.g.
+    BF-EDD0.4m-FD0.6m-DC.dcv, PB-MD0.75m-DC.dcv or WSUR-EDD0.25m-DC.dcv. Returns a dictionary with the keys
+    "Type", "EDD", "FD" and "MD" (None if the spec is not part of the name) or None if the name is not recognised.
+    """
+    match = DCV_FILENAME_PATTERN.match(os.path.basename(filename))
+    if match is None:
+        return None
+    specs = {"Type": match.group("Type")}
+    for spec in ["EDD", "FD", "MD"]:
+        if match.group(spec) is None:
+            specs[spec] = None
+        else:
+            specs[spec] = float(match.group(spec))
+    return specs
+
+def compileDCVBundle(curvedir, bundlefile=None):
+    """Compiles all .dcv files of a design curve directory (e.g. ancillary/wsudcurves/Melbourne) into a single
+    binary bundle that getDesignCurve() memory-maps instead of parsing the text files. This is an offline step and
+    needs to be repeated whenever curves in the directory are added or changed.
+    Bundle layout: magic string, header length [uint64], JSON header table (one entry per curve with its file name,
+    modification time, system type, EDD, FD, MD, offset and number of rows), padding to 8 bytes, then all curves as contiguous
+    little-endian float64 blocks of shape (7 x rows), sorted by exfiltration rate.
+    Returns the path of the bundle file.
+    """
+    if bundlefile is None:
+        bundlefile = os.path.join(curvedir, DCV_BUNDLE_NAME)
+    header = {"columns": 7, "curves": []}
+    blocks = []
+    offset = 0
+    for filename in sorted(os.listdir(curvedir)):
+        if not filename.endswith(".dcv"):
+            continue
+        data = np.loadtxt(os.path.join(curvedir, filename), delimiter=',', skiprows=1, usecols=range(7), ndmin=2)
+        curve = DesignCurve(data.T)
+        block = np.ascontiguousarray([curve[i] for i in range(7)], dtype='<f8')
+        entry = {"File": filename, "Mtime": os.path.getmtime(os.path.join(curvedir, filename)),
+                 "Offset": offset, "Rows": block.shape[1]}
+        specs = parseDCVFilename(filename)
+        if specs is not None:
+            entry.update(specs)
+        header["curves"].append(entry)
+        blocks.append(block)
+        offset += block.size
+
+    headerstring = json.dumps(header).encode("ascii")
+    padding = (8 - (len(DCV_BUNDLE_MAGIC) + 8 + len(headerstring)) % 8) % 8
+    f = open(bundlefile, 'wb')
+    f.write(DCV_BUNDLE_MAGIC.encode("ascii"))
+    f.write(struct.pack("<Q", len(headerstring) + padding))
+    f.write(headerstring + b" " * padding)
+    for block in blocks:
+        f.write(block.tobytes())
+    f.close()
+    return bundlefile
+
+def loadDCVBundle(bundlefile):
+    """Memory-maps a compiled design curve bundle and registers all of its curves in DCV_CACHE under the path of
+    their original .dcv file. A bundle is only looked up once per process. Each curve is cached with the path and
+    modification time of its own .dcv file, so editing the file later invalidates the curve in getDesignCurve().
+    Curves whose text file has changed since the bundle was compiled are skipped, so that they are parsed from the
+    text file instead. Bundles without file times in the header count a file as changed if it is newer than the
+    bundle. Returns True if a bundle was loaded.
+    """
+    curvedir = os.path.dirname(bundlefile)
+    if curvedir in DCV_BUNDLES:
+        return DCV_BUNDLES[curvedir] is not None
+    DCV_BUNDLES[curvedir] = None
+    if not os.path.isfile(bundlefile):
+        return False
+
+    f = open(bundlefile, 'rb')
+    magic = f.read(len(DCV_BUNDLE_MAGIC)).decode("ascii")
+    if magic != DCV_BUNDLE_MAGIC:
+        f.close()
+        print "Warning: "+str(bundlefile)+" is not a design curve bundle, reading .dcv files instead"
+        return False
+    headerlength = struct.unpack("<Q", f.read(8))[0]
+    header = json.loads(f.read(headerlength).decode("ascii"))
+    f.close()
+
+    bundlemtime = os.path.getmtime(bundlefile)
+    datastart = len(DCV_BUNDLE_MAGIC) + 8 + headerlength
+    totalvalues = sum([entry["Rows"] * header["columns"] for entry in header["curves"]])
+    bundledata = np.memmap(bundlefile, dtype='<f8', mode='r', offset=datastart, shape=(totalvalues,))
+    for entry in header["curves"]:
+        pathfname = os.path.normpath(os.path.join(curvedir, entry["File"]))
+        block = bundledata[entry["Offset"]:entry["Offset"] + entry["Rows"] * header["columns"]]
+        curve = DesignCurve(block.reshape(header["columns"], entry["Rows"]))
+        if not os.path.isfile(pathfname):
+            DCV_CACHE[pathfname] = [bundlefile, bundlemtime, curve]     #only the bundle holds this curve
+            continue
+        filemtime = os.path.getmtime(pathfname)
+        if "Mtime" in entry:
+            edited = filemtime != entry["Mtime"]
+        else:
+            edited = filemtime > bundlemtime       #bundle compiled before file times were recorded
+        if edited:
+            continue        #curve has been edited since the bundle was compiled
+        DCV_CACHE[pathfname] = [pathfname, filemtime, curve]
+    DCV_BUNDLES[curvedir] = bundlemtime
+    return True
+
+class DesignCurveRegistry(object):
+    def __init__(self, curvesroot):
+        """Lookup table of all design curves under 'curvesroot' (e.g. ancillary/wsudcurves). Every city directory is
+        scanned once and the specifications of each curve are parsed from its file name. Curves themselves are only
+        read when they are first used, through getDesignCurve().
+        """
+        self.__root = curvesroot
+        self.__index = {}       #{(city, type, EDD, FD, MD) : path of the .dcv file}
+        self.__cities = []
+        if not os.path.isdir(curvesroot):
+            print "Warning: no design curve directory found at "+str(curvesroot)
+            return
+        for city in sorted(os.listdir(curvesroot)):
+            citydir = os.path.join(curvesroot, city)
+            if not os.path.isdir(citydir):
+                continue
+            self.__cities.append(city)
+            for filename in os.listdir(citydir):
+                specs = parseDCVFilename(filename)
+                if specs is None:
+                    continue
+                key = self.getKey(city, specs["Type"], specs["EDD"], specs["FD"], specs["MD"])
+                self.__index[key] = os.path.join(citydir, filename)
+
+    def getKey(self, city, techtype, EDD=None, FD=None, MD=None):
+        """Returns the lookup key of a curve, specs are rounded so that 0.6 and "0.6" resolve to the same file."""
+        specs = []
+        for value in [EDD, FD, MD]:
+            if value is None:
+                specs.append(None)
+            else:
+                specs.append(round(float(value), 4))
+        return (city, techtype, specs[0], specs[1], specs[2])
+
+    def getCities(self):
+        return self.__cities
+
+    def getCurvePath(self, city, techtype, EDD=None, FD=None, MD=None):
+        """Returns the path of the design curve file for the given city, system type and specs or None if the
+        registry does not contain such a curve."""
+        return self.__index.get(self.getKey(city, techtype, EDD, FD, MD))
+
+    def getCurve(self, city, techtype, EDD=None, FD=None, MD=None):
+        """Returns the DesignCurve for the given city, system type and specs, loading it on first use."""
+        pathfname = self.getCurvePath(city, techtype, EDD, FD, MD)
+        if pathfname is None:
+            return None
+        return getDesignCurve(pathfname)
+
+DCV_REGISTRIES = {}         #Registries scanned so far in this process {curves root : DesignCurveRegistry}
+
+def getDesignCurveRegistry(curvesroot):
+    """Returns the registry of the design curve directory 'curvesroot', the directory is only scanned once per
+    process."""
+    key = os.path.normpath(curvesroot)
+    if key not in DCV_REGISTRIES:
+        DCV_REGISTRIES[key] = DesignCurveRegistry(key)
+    return DCV_REGISTRIES[key]
+
+class DesignCurve(object):
+    def __init__(self, data):
+        """A parsed design curve with a pre-built index of its exfiltration rates.
+            data = seven columns of the .dcv file [Size, ExfRate, FlowRed, TSSRed, TPRed, TNRed, GPRed]
+        Rows are grouped by exfiltration rate (ksat). The index holds the sorted unique ksat values and the row
+        offsets of each group, so that a bracket is a slice of the underlying array rather than a copy.
+        """
+        data = np.asarray(data, dtype=float)
+        if np.any(np.diff(data[1]) < 0):
+            order = np.argsort(data[1], kind='mergesort')    #stable sort keeps the size order within each ksat group
+            data = data[:,order]
+        self.__data = np.ascontiguousarray(data)      #curves from a bundle are already sorted and remain mapped
+        self.__kvalues, self.__kstart, kcounts = np.unique(self.__data[1], return_index=True, return_counts=True)
+        self.__kend = self.__kstart + kcounts
+
+    def __getitem__(self, column):
+        return self.__data[column]
+
+    def __len__(self):
+        return len(self.__data)
+
+    def getKValues(self):
+        return self.__kvalues
+
+    def getGroup(self, kindex):
+        """Returns the rows of the kindex-th ksat group as a (7 x n) view of the curve"""
+        return self.__data[:,self.__kstart[kindex]:self.__kend[kindex]]
+
+    def getBracketIndices(self, ksat):
+        """Returns the indices of the lower and upper ksat groups bracketing the exfiltration rate ksat. If
+        ksat lies outside the range of the curve, both indices point at the nearest group."""
+        if ksat <= self.__kvalues[0]:
+            return 0, 0
+        if ksat >= self.__kvalues[-1]:
+            return len(self.__kvalues)-1, len(self.__kvalues)-1
+        kup = int(np.searchsorted(self.__kvalues, ksat, side='right'))
+        return kup-1, kup
+
+### ------------------------------------------------------------------------ ###
+###     DESIGN BY DESIGN CURVES                                              ###
+### ------------------------------------------------------------------------ ###
+
 def retrieveDesign(pathname, systemtype, ksat, targets):
     #Step 1: Read DCV file
     dcv = readDCVFile(pathname, systemtype)
@@ -44,97 +297,23 @@ def retrieveDesign(pathname, systemtype, ksat, targets):
 
 
 def readDCVFile(pathfname, systemtype):
-    f = open(pathfname, 'r')    #Note: must do conversion to raw string or else will not work on some PCs
-    designcurve = []
-    for lines in f:
-        designcurve.append(lines.split(','))          
-    f.close()
-    finaldcv = [[],[],[],[],[],[],[]]
-    for i in range(len(designcurve)):
-        if i == 0:
-            #print designcurve[i]
-            continue
-        for j in range(len(designcurve[i])):
-            # print designcurve[i][j]
-            finaldcv[j].append(float(designcurve[i][j]))
-    return finaldcv
+    """Retrieves the design curve of the .dcv file, see getDesignCurve(). The file is only read from disk the first
+    time it is requested or if it has been modified since."""
+    return getDesignCurve(pathfname)
 
 def bracketDCVFile(array, ksat):
-    #function to retrieve the arrays from the DCV file from which design can be undertaken
-    #   array = dcv array
-    #   ksat = exfiltration rate for which to find the bracket
-    #   match = indicates whether it's an close match (0) or a double bracket (1)
-    #           if exact, function returns one array, if double bracket, function returns two arrays
-
-    #Step 1: obtain unique kvalue
-    kuniques = []
-    for i in array[1]:
-        if i in kuniques:
-            continue
-        kuniques.append(i)
-    #print kuniques
-    
-    #Step 2a: check if ksat falls within the k-values of the dcv, if not, only work with one bracket
-    kmin = min(array[1])
-    #print "Kmin ", kmin
-    kmax = max(array[1])
-    if ksat <= kmin or ksat >= kmax:
-        #print "Warning, ksat is not within bounds of dcv file, using single value"
-        if ksat <= kmin:
-            klow = kmin
-            kup = kmin
-        else:
-            klow = kmax
-            kup = kmax
-    else:
-        #Step 2b: if there are two brackets because ksat falls within range of kmin, kmax, find the values
-        klow = kmin    #initialize lower and upper k brackets
-        kup = klow
-        for i in range(len(kuniques)):
-            if kup > ksat:
-                continue
-            klow = kuniques[i]
-            kup = kuniques[i+1]
-        #print klow, kup
-    
-    #Step 3: Retrieve brackets        
-    lowerbracket = [[],[],[],[],[],[],[]]
-    upperbracket = [[],[],[],[],[],[],[]]
-    if klow == kup:     #one bracket
-        index = array[1].index(klow)
-        while array[1][index] == klow:
-            for i in range(7):
-                lowerbracket[i].append(array[i][index])
-                upperbracket[i].append(array[i][index])                
-            if index == len(array[1])-1:    #if kup is the last bracket in the file, need to terminate while loop in a different way
-                break
-            else:
-                index += 1
-        #print lowerbracket
-        #print upperbracket
-    
-    if klow != kup: #two brackets
-        index = array[1].index(klow)
-        while array[1][index] == klow:
-            for i in range(7):
-                lowerbracket[i].append(array[i][index])
-            if index == len(array[1])-1:    #if kup is the last bracket in the file, need to terminate while loop in a different way
-                break
-            else:
-                index += 1
-            index += 1
-        index = array[1].index(kup)
-        while array[1][index] == kup:
-            for i in range(7):
-                upperbracket[i].append(array[i][index])
-            if index == len(array[1])-1:    #if kup is the last bracket in the file, need to terminate while loop in a different way
-                break
-            else:
-                index += 1
-        #print lowerbracket
-        #print upperbracket
-    
-    return klow, kup, lowerbracket, upperbracket
+    """Retrieves the two sections of the design curve between which the design for exfiltration rate ksat is
+    interpolated.
+        - array = DesignCurve (or the seven columns of a .dcv file)
+        - ksat = exfiltration rate for which to find the bracket
+    Returns the lower and upper ksat values and the lower and upper brackets as views of the design curve. If ksat
+    lies outside the range of the curve, both brackets are the same.
+    """
+    if not isinstance(array, DesignCurve):
+        array = DesignCurve(array)
+    kvalues = array.getKValues()
+    lowdex, updex = array.getBracketIndices(ksat)
+    return kvalues[lowdex], kvalues[updex], array.getGroup(lowdex), array.getGroup(updex)
     
 def findTargetSize(bracket, targetvalues):
     #retrieves the required system size for given targetvalues
@@ -142,10 +321,9 @@ def findTargetSize(bracket, targetvalues):
     #loop through the five different targets    
     for i in range(len(targetvalues)):
         #find the value in the bracket
-        targetmax = max(bracket[i+2])   #offset the index by 2
-        #print targetmax        
+        performance = bracket[i+2]      #offset the index by 2
+        targetmax = performance.max()
         target = targetvalues[i]
-        #print target
         if target > targetmax:      #if required target exceeds that of max, cannot design
             #print ".dcv designs cannot meet current target"
             Apercent.append(np.inf)
@@ -153,18 +331,20 @@ def findTargetSize(bracket, targetvalues):
         elif target == 0:
             Apercent.append(0)
             continue    #if target is zero, just return zero
+        #find the first row of the bracket that meets the target, the lower bound is the row before it
         lower = 0                   #initialize lower and upper variables
-        upper = min(bracket[i+2])
-        for j in range(len(bracket[i+2])):
-            if target <= upper:
-                continue
-            lower = upper
-            upper = bracket[i+2][j]
+        upper = performance.min()
+        if target > upper:
+            updex = int(np.argmax(performance >= target))
+            if updex == 0:
+                lower, upper = upper, performance[0]
+            else:
+                lower, upper = performance[updex-1], performance[updex]
         #grab indices for Asystem in bracket[0]
         if lower == 0:       #but if the lower bound is zero, which isn't in the .dcv, go straight to interpolation
             Apercent.append(linearInterpolate(lower, upper, 0, bracket[0][0], target))
             continue
-        mindex = bracket[i+2].index(lower)
+        mindex = int(np.flatnonzero(performance == lower)[0])
         maxdex = mindex + 1
         Apercent.append(linearInterpolate(lower, upper, bracket[0][mindex], bracket[0][maxdex], target))
     #final Apercent has sizes for [Qreduction, TSSreduction, TPreduction, TNreduction, GPreduction]
@@ -192,6 +372,278 @@ def linearInterpolate(x0, x1, y0, y1, x):
     y = y0+(x - x0)*((y1 - y0)/(x1 - x0))
     return y
 
+### ------------------------------------------------------------------------ ###
+###     BATCH DESIGN BY DESIGN CURVES                                        ###
+### ------------------------------------------------------------------------ ###
+
+def retrieveDesignBatch(pathname, systemtype, ksat, targets):
+    """Vectorised version of retrieveDesign(), answers many design questions on the same design curve in one call.
+        - pathname: path to the .dcv file
+        - systemtype: the system's abbreviation, e.g. BF
+        - ksat: array of N exfiltration rates
+        - targets: a single target vector, applied to all ksat values, or an (N x T) matrix of target vectors
+    Returns an array of N required system sizes [fraction of impervious area], np.inf where the curve cannot meet
+    the targets. Each element is identical to retrieveDesign(pathname, systemtype, ksat[i], targets[i]).
+    """
+    dcv = readDCVFile(pathname, systemtype)
+    ksat = np.atleast_1d(np.asarray(ksat, dtype=float))
+    targets = np.asarray(targets, dtype=float)
+    if targets.ndim == 1:
+        targets = np.tile(targets, (len(ksat), 1))
+
+    #Step 1: Get Brackets
+    kvalues = dcv.getKValues()
+    updex = np.searchsorted(kvalues, ksat, side='right')
+    lowdex = updex - 1
+    outofrange = ksat <= kvalues[0]
+    lowdex[outofrange], updex[outofrange] = 0, 0
+    outofrange = ksat >= kvalues[-1]
+    lowdex[outofrange], updex[outofrange] = len(kvalues)-1, len(kvalues)-1
+
+    #Step 2: Get both sets of areas, each ksat group is visited once for all elements that need it
+    areaslower = np.empty(targets.shape)
+    areasupper = np.empty(targets.shape)
+    for kindex in np.unique(np.concatenate([lowdex, updex])):
+        islower = lowdex == kindex
+        isupper = updex == kindex
+        rows = np.flatnonzero(islower | isupper)
+        areas = findTargetSizeBatch(dcv.getGroup(kindex), targets[rows])
+        areaslower[islower] = areas[islower[rows]]
+        areasupper[isupper] = areas[isupper[rows]]
+
+    #Step 3: Get final design area
+    return getFinalSizeRequirementBatch(kvalues[lowdex], kvalues[updex], areaslower, areasupper, ksat)
+
+def findTargetSizeBatch(bracket, targetvalues):
+    """Vectorised version of findTargetSize(), retrieves the required system sizes [%] of one bracket for an
+    (M x T) matrix of target vectors. Returns an (M x T) matrix of sizes, np.inf where a target cannot be met."""
+    sizes = bracket[0]
+    Apercent = np.empty(targetvalues.shape)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i in range(targetvalues.shape[1]):
+            performance = bracket[i+2]      #offset the index by 2
+            target = targetvalues[:,i]
+            cmin = performance.min()
+
+            #first row of the bracket that meets the target, the lower bound is the row before it
+            meets = performance[np.newaxis,:] >= target[:,np.newaxis]
+            updex = np.argmax(meets, axis=1)
+            lower = np.where(updex == 0, cmin, performance[np.maximum(updex-1, 0)])
+            upper = performance[updex]
+            belowmin = target <= cmin
+            lower[belowmin] = 0
+            upper[belowmin] = cmin
+
+            #grab indices for Asystem in bracket[0], the lower bound of zero isn't in the .dcv
+            mindex = np.argmax(performance[np.newaxis,:] == lower[:,np.newaxis], axis=1)
+            maxdex = np.minimum(mindex + 1, len(sizes)-1)
+            fromzero = linearInterpolate(lower, upper, 0, sizes[0], target)
+            frombracket = linearInterpolate(lower, upper, sizes[mindex], sizes[maxdex], target)
+            Apercent[:,i] = np.where(lower == 0, fromzero, frombracket)
+
+            Apercent[target == 0, i] = 0                    #if target is zero, just return zero
+            Apercent[target > performance.max(), i] = np.inf     #if required target exceeds that of max, cannot design
+    return Apercent
+
+def getFinalSizeRequirementBatch(klow, kup, minsizes, maxsizes, ksat):
+    """Vectorised version of getFinalSizeRequirement(), takes arrays of N bracket ksat values and the (N x T)
+    matrices of sizes of the lower and upper brackets. Returns the array of N final sizes as fraction."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        Apercent = linearInterpolate(klow[:,np.newaxis], kup[:,np.newaxis], minsizes, maxsizes, ksat[:,np.newaxis])
+    Apercent[np.isinf(minsizes) | np.isinf(maxsizes)] = np.inf
+    onebracket = klow == kup        #if there was only one bracket, no interpolation needed
+    Apercent[onebracket] = minsizes[onebracket]
+    return Apercent.max(axis=1)/100
+
+### ------------------------------------------------------------------------ ###
+###     MEMOISED DESIGN RESULTS                                              ###
+### ------------------------------------------------------------------------ ###
+
+class DesignMemo(object):
+    def __init__(self, maxsize):
+        """A bounded, least-recently-used memo of design curve results. The required system size only depends on
+        the design curve, the exfiltration rate and the target vector, so repeated designs for other impervious
+        areas, increments, land uses or blocks collapse to a dictionary lookup.
+            maxsize = maximum number of results held before the least recently used ones are dropped
+        """
+        self.__maxsize = maxsize
+        self.__results = collections.OrderedDict()
+        self.__hits = 0
+        self.__misses = 0
+
+    def getKey(self, pathname, systemtype, ksat, targets):
+        return (pathname, systemtype, float(ksat), tuple([float(t) for t in targets]))
+
+    def retrieveDesign(self, pathname, systemtype, ksat, targets):
+        """Returns the memoised result of retrieveDesign(), designs and stores it if not yet known"""
+        key = self.getKey(pathname, systemtype, ksat, targets)
+        if key in self.__results:
+            self.__hits += 1
+            finalarea = self.__results.pop(key)      #re-insert to mark as most recently used
+            self.__results[key] = finalarea
+            return finalarea
+        self.__misses += 1
+        finalarea = retrieveDesign(pathname, systemtype, ksat, targets)
+        self.storeDesign(key, finalarea)
+        return finalarea
+
+    def storeDesign(self, key, finalarea):
+        self.__results[key] = finalarea
+        while len(self.__results) > self.__maxsize:
+            self.__results.popitem(last=False)
+        return True
+
+    def preloadDesigns(self, pathname, systemtype, ksat, targets):
+        """Designs all exfiltration rates in the array ksat for one target vector with a single call to
+        retrieveDesignBatch() and stores the results that are not yet known."""
+        ksat = np.unique(np.asarray(ksat, dtype=float))
+        keys = [self.getKey(pathname, systemtype, k, targets) for k in ksat]
+        missing = [i for i in range(len(keys)) if keys[i] not in self.__results]
+        if len(missing) == 0:
+            return 0
+        finalareas = retrieveDesignBatch(pathname, systemtype, ksat[missing], targets)
+        for i in range(len(missing)):
+            self.storeDesign(keys[missing[i]], float(finalareas[i]))
+        return len(missing)
+
+    def clear(self):
+        self.__results.clear()
+        self.__hits = 0
+        self.__misses = 0
+        return True
+
+    def getStats(self):
+        """Returns the number of hits, misses, results held and the hit rate of the memo"""
+        lookups = self.__hits + self.__misses
+        if lookups == 0:
+            hitrate = 0.0
+        else:
+            hitrate = float(self.__hits) / lookups
+        return {"hits": self.__hits, "misses": self.__misses, "size": len(self.__results), "hitrate": hitrate}
+
+DESIGN_MEMO = DesignMemo(4096)      #Process-wide memo used by the design functions in tech_design
+
+def retrieveDesignCached(pathname, systemtype, ksat, targets):
+    """Same as retrieveDesign(), but answers repeated design questions from the process-wide DESIGN_MEMO. If the
+    size fraction grids are switched on (see setDesignGridResolution()), the design is interpolated from the grid."""
+    if DESIGN_GRID_SETTINGS["resolution"]:
+        return retrieveDesignFromGrid(pathname, systemtype, ksat, targets)
+    return DESIGN_MEMO.retrieveDesign(pathname, systemtype, ksat, targets)
+
+def preloadDesignMemo(pathname, systemtype, ksat, targets):
+    """Fills the DESIGN_MEMO with the designs for an array of exfiltration rates, see DesignMemo.preloadDesigns().
+    With the size fraction grids switched on, the grid of the curve and targets is tabulated instead."""
+    if DESIGN_GRID_SETTINGS["resolution"]:
+        getSizeFractionGrid(pathname, systemtype, targets)
+        return 0
+    return DESIGN_MEMO.preloadDesigns(pathname, systemtype, ksat, targets)
+
+def clearDesignMemo():
+    """Clears the DESIGN_MEMO and the size fraction grids, called at the start of a planning run because the
+    targets may have changed"""
+    DESIGN_GRIDS.clear()
+    return DESIGN_MEMO.clear()
+
+def getDesignMemoStats():
+    return DESIGN_MEMO.getStats()
+
+### ------------------------------------------------------------------------ ###
+###     SIZE FRACTION GRIDS                                                  ###
+### ------------------------------------------------------------------------ ###
+
+class SizeFractionGrid(object):
+    def __init__(self, pathname, systemtype, targets, resolution):
+        """The result of retrieveDesign() for one design curve and target vector, tabulated on a uniform ksat grid
+        so that a design becomes an array index and a linear interpolation.
+            pathname, systemtype, targets = as for retrieveDesign()
+            resolution = spacing of the ksat grid [mm/hr]
+        The grid spans the exfiltration rates of the curve, designs outside this range are constant. Cells in which
+        the curve cannot meet the targets are not interpolated, designs falling into them use the exact path.
+        """
+        self.__pathname = pathname
+        self.__systemtype = systemtype
+        self.__targets = targets
+        kvalues = readDCVFile(pathname, systemtype).getKValues()
+        self.__kmin = float(kvalues[0])
+        self.__kmax = float(kvalues[-1])
+        self.__step = float(resolution)
+        cells = max(int(np.ceil((self.__kmax - self.__kmin) / self.__step)), 1)
+        gridk = self.__kmin + self.__step * np.arange(cells + 1)
+        self.__sizes = retrieveDesignBatch(pathname, systemtype, gridk, targets)
+        self.__sizekmax = retrieveDesign(pathname, systemtype, self.__kmax, targets)
+
+        #Check the interpolation at the centre of each cell and at the curve's exfiltration rates
+        checkk = np.concatenate([gridk[:-1] + self.__step / 2, kvalues])
+        checkk = checkk[checkk < gridk[-1]]
+        exact = retrieveDesignBatch(pathname, systemtype, checkk, targets)
+        cellindex = np.minimum(((checkk - self.__kmin) / self.__step).astype(int), cells - 1)
+        self.__exactcells = np.isinf(self.__sizes[:-1]) | np.isinf(self.__sizes[1:])
+        self.__exactcells[cellindex[np.isinf(exact)]] = True
+        with np.errstate(invalid='ignore'):
+            interpolated = self.interpolateCell(checkk, cellindex)
+        checked = np.logical_not(self.__exactcells[cellindex])
+        if np.any(checked):
+            self.__maxerror = float(np.abs(interpolated[checked] - exact[checked]).max())
+        else:
+            self.__maxerror = 0.0
+
+    def interpolateCell(self, ksat, cell):
+        fraction = (ksat - self.__kmin) / self.__step - cell
+        return self.__sizes[cell] + fraction * (self.__sizes[cell+1] - self.__sizes[cell])
+
+    def retrieveDesign(self, ksat):
+        """Returns the required system size [fraction of impervious area] for exfiltration rate ksat"""
+        if ksat <= self.__kmin:
+            return float(self.__sizes[0])
+        if ksat >= self.__kmax:
+            return float(self.__sizekmax)
+        cell = min(int((ksat - self.__kmin) / self.__step), len(self.__exactcells) - 1)
+        if self.__exactcells[cell]:
+            return DESIGN_MEMO.retrieveDesign(self.__pathname, self.__systemtype, ksat, self.__targets)
+        return float(self.interpolateCell(ksat, cell))
+
+    def getMaxError(self):
+        """Returns the largest difference between the interpolated and exact design found when the grid was
+        tabulated [fraction of impervious area]"""
+        return self.__maxerror
+
+    def getGridSize(self):
+        return len(self.__sizes)
+
+DESIGN_GRIDS = {}                           #Size fraction grids of the current run {(path, type, targets) : grid}
+DESIGN_GRID_SETTINGS = {"resolution": None} #ksat grid spacing [mm/hr], None uses the exact design path
+
+def setDesignGridResolution(resolution):
+    """Switches the size fraction grids on with the given ksat resolution [mm/hr] or off if resolution is None or 0.
+    Grids tabulated with a previous resolution are discarded."""
+    DESIGN_GRIDS.clear()
+    if resolution:
+        DESIGN_GRID_SETTINGS["resolution"] = float(resolution)
+    else:
+        DESIGN_GRID_SETTINGS["resolution"] = None
+    return True
+
+def getSizeFractionGrid(pathname, systemtype, targets):
+    """Returns the SizeFractionGrid of the design curve and target vector, tabulating it on first use"""
+    key = (pathname, systemtype, tuple([float(t) for t in targets]))
+    if key not in DESIGN_GRIDS:
+        DESIGN_GRIDS[key] = SizeFractionGrid(pathname, systemtype, targets, DESIGN_GRID_SETTINGS["resolution"])
+    return DESIGN_GRIDS[key]
+
+def retrieveDesignFromGrid(pathname, systemtype, ksat, targets):
+    """Same as retrieveDesign(), but interpolated from the SizeFractionGrid of the design curve and targets"""
+    return getSizeFractionGrid(pathname, systemtype, targets).retrieveDesign(ksat)
+
+def getDesignGridStats():
+    """Returns the number of grids tabulated in this run, their total number of grid points and the maximum
+    interpolation error found across all grids"""
+    maxerror = 0.0
+    points = 0
+    for grid in DESIGN_GRIDS.values():
+        maxerror = max(maxerror, grid.getMaxError())
+        points += grid.getGridSize()
+    return {"grids": len(DESIGN_GRIDS), "points": points, "maxerror": maxerror}
+
 ### ------------------------------------------------------------------------ ###
 ###     SUBFUNCTIONS FOR STORMWATER HARVESTING BENEFITS                      ###
 ### ------------------------------------------------------------------------ ###
@@ -222,20 +674,58 @@ def treatQTYbenefits(wsudobj, runoffrate, designAimp):
     return True
 
 def initializeSWHbenefitsTable(filepath):
-    """Initialises the SWH benefits dictionary from the swhbenefits.cfg file, which contains the lookup table of
+    """Initialises the SWH benefits table from the swhbenefits.cfg file, which contains the lookup table of
     empirical m-values and bthresh values for calculating impervious area offset (IAO) for water quality control.
+    Returns an SWHBenefitsTable indexed by system type and pollutant.
     """
     f = open(filepath+"/swhbenefits.cfg", 'r')
-    swhbenefitstable = []
+    rows = []
     f.readline()
     for lines in f:
         data = lines.split(',')
+        if len(data) < 5:
+            continue
         data[2] = float(data[2])    #Convert target to float
         data[3] = float(data[3])    #Convert m-value to float
         data[4] = float(data[4])    #Convert bthresh to float
-        swhbenefitstable.append(data)
-
-    return swhbenefitstable
+        rows.append(data)
+    f.close()
+    return SWHBenefitsTable(rows)
+
+class SWHBenefitsTable(object):
+    def __init__(self, rows):
+        """The SWH benefits lookup table indexed by (system type, pollutant). Each index entry holds the targets of
+        the table in ascending order and the m-values and bthresh values belonging to them.
+            rows = lines of swhbenefits.cfg as [Type, Pollutant, Target, m-value, bthresh]
+        The m and bthresh values found for a system type and target vector are kept for the rest of the run.
+        """
+        self.__index = {}
+        self.__results = {}
+        for key in set([(row[0], row[1]) for row in rows]):
+            entries = sorted([[row[2], row[3], row[4]] for row in rows if (row[0], row[1]) == key])
+            self.__index[key] = np.array(entries).T      #[targets, m-values, bthresh values]
+
+    def getPollutantTable(self, systype, pollutant):
+        """Returns the [targets, m-values, bthresh values] arrays of the system type and pollutant or None"""
+        return self.__index.get((systype, pollutant))
+
+    def lookupBenefit(self, systype, targets):
+        """Returns the lists of m and bthresh values of the system type for the TSS, TP and TN targets. Targets
+        below the table's range use the values of its lowest target, targets above its range get no benefit."""
+        key = (systype, tuple([float(t) for t in targets]))
+        if key in self.__results:
+            return self.__results[key]
+        m = []
+        bthresh = []
+        pollutants = ["TSS", "TP", "TN"]
+        for i in range(len(targets)):
+            table = self.getPollutantTable(systype, pollutants[i])
+            if table is None:
+                continue
+            m.append(float(np.interp(targets[i], table[0], table[1], right=0)))
+            bthresh.append(float(np.interp(targets[i], table[0], table[2], right=0)))
+        self.__results[key] = [m, bthresh]
+        return m, bthresh
 
 
 def treatWQbenefits(wsudobj, runoffrate, targets, designAimp, swhbenefitstable):
@@ -273,15 +763,12 @@ def treatWQbenefits(wsudobj, runoffrate, targets, designAimp, swhbenefitstable):
     m, bthresh = lookupSWHbenefit(systype, targets, swhbenefitstable)
 
     #Apply the SWH Benefits equation for water quality
-    qualityIAOs = []    #will have IAOs based on TSS, TP, TN, the final is the minimum of all three or zero
-
-    for i in range(len(m)):
-        qualityIAOs.append(m[i] * max((pext - bthresh[0]),0) * Aimp)  #Additional impervious area that can be left untreated for water quality
-                                                                      #based on the stormwater harvesting benefits perceived [sqm].
+    #Additional impervious area that can be left untreated for water quality based on the stormwater harvesting
+    #benefits perceived [sqm], the IAOs based on TSS, TP, TN are m * extraction above threshold * Aimp
     if len(m) == 0:
         qualityIAO = 0.0                    #just to avoid the ValueError if an empty array is tested for its minimum.
     else:
-        qualityIAO = min(qualityIAOs)         #minimum of the three
+        qualityIAO = min(m) * max((pext - bthresh[0]),0) * Aimp       #minimum of the three
         qualityIAO = max(qualityIAO, 0.0)     #if the benefits is less than zero, adjust to zero
 
     wsudobj.setIAO("WQ", qualityIAO)
@@ -290,58 +777,11 @@ def treatWQbenefits(wsudobj, runoffrate, targets, designAimp, swhbenefitstable):
 
 def lookupSWHbenefit(systype, targets, swhbenefitstable):
     """Lookup function for the empirical SWH benefits equation for pollution management. The lookup is driven by
-    system type and the treatment targets.
+    system type and the treatment targets, see SWHBenefitsTable.lookupBenefit().
     """
-    m = []           #The slope of the empirical benefits equation, i.e. rate of IAO increase per unit extraction
-    bthresh = []     #The extraction threshold at which benefits begin
-
-    #Lookup m and bthresh for the different targets and pick the worst case scenario.
-    sysTSS = []
-    sysTP = []
-    sysTN = []
-    # print swhbenefitstable
-    for i in range(len(swhbenefitstable)):
-        if swhbenefitstable[i][0] != systype:
-            continue
-        # print "sys"+str(swhbenefitstable[i][1])+".append("+(str(swhbenefitstable[i]))+")"
-        eval("sys"+str(swhbenefitstable[i][1])+".append("+(str(swhbenefitstable[i]))+")")
-
-    pollmatrix = [sysTSS, sysTP, sysTN]
-
-    # print sysTSS, sysTP, sysTN
-
-    #Interpolate for given targets to get m and bthresh values
-    for i in range(len(targets)):
-        curpoll = pollmatrix[i]
-        curpollT = [[row[j] for row in curpoll] for j in range(len(curpoll[0]))]    #List comprehension to transport the matrix
-        # print "DEBUG", curpollT
-        curtarget = targets[i]
-
-        #Work out the m and b values by interpolation
-        # print "CURTARGET", curtarget
-        if curtarget in curpollT[2]:        #If the target is identical to the target for which m and b values exist then simply select
-            m.append(curpollT[3][curpollT[2].index(curtarget)])
-            bthresh.append(curpollT[4][curpollT[2].index(curtarget)])
-        elif curtarget < min(curpollT[2]):  #if the target is less than the minimum in the table, use the minimum benefits
-            m.append(curpoll[3][curpollT.index(min(curpollT[2]))])
-            bthresh.append(curpoll[4][curpollT.index(min(curpollT[2]))])
-        elif curtarget > max(curpollT[2]):   #If the target is greater than the maximum in the table, assume no benefit
-            m.append(0)
-            bthresh.append(0)
-        else:       #finally, if none of the above apply, then the target is between the bounds
-            j_index, found = 0, 0
-            while found == 0:
-                if curtarget < curpollT[2][j_index] and curtarget > curpollT[2][j_index + 1]: #if less than
-                    tupper, tlower = curpollT[2][j_index], curpollT[2][j_index + 1]   #X
-                    mupper, mlower = curpollT[3][j_index], curpollT[3][j_index + 1]   #Y1
-                    bupper, blower = curpollT[4][j_index], curpollT[4][j_index + 1]   #Y2
-                    found = 1
-                else: j_index += 1
-            m.append(linearInterpolate(tlower,tupper,mlower,mupper,curtarget))  #Interpolate for m
-            if bupper == 0 and blower == 0:
-                bthresh.append(0)
-            else:
-                bthresh.append(linearInterpolate(tlower,tupper,blower,bupper,curtarget))  #Interpolate for bthresh
-    # print "Debug", m, bthresh
-    return m, bthresh
+    return swhbenefitstable.lookupBenefit(systype, targets)
 
+if __name__ == "__main__":
+    #Offline step: python tech_designbydcv.py <path to wsudcurves/city directory>
+    import sys
+    print "Compiled design curve bundle: "+str(compileDCVBundle(sys.argv[1]))
@@ -24,6 +24,7 @@ Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """
 
 import numpy as np
+import ubseriesread as ubseries
 
 ### ------------------------------------------------------------------------ ###
 ###     SUBFUNCTIONS FOR STORAGE-BEHAVIOUR EQUATION                          ###
@@ -74,5 +75,61 @@ def loglogSWHEquation(city, targetrel, supplyvol, demandvol):
     storagevol = (targetrel**coefficients[0])*((dvavg+1)**coefficients[1])*(rmse**coefficients[2])*(10**coefficients[3])
     return storagevol
 
+class SWHSeriesMoments(object):
+    def __init__(self, unitinflow, unitdemand):
+        """Sums over a unit inflow series (inflow per sqm of catchment) and a unit demand series (demand per kL/yr
+        of annual demand). Any inflow = a * unitinflow and demand = b * unitdemand has
+            sum(inflow) = a * sum(unitinflow), sum(demand) = b * sum(unitdemand) and
+            sum((inflow - demand)^2) = a^2 * sum(unitinflow^2) - 2ab * sum(unitinflow*unitdemand) + b^2 * sum(unitdemand^2)
+        so the inputs of the SWH equation follow for any catchment area a and annual demand b without the series.
+            - unitinflow, unitdemand: single-dimensional lists or ubseries.ScaledSeries views of the same length,
+                    the sums of views are taken over their base arrays
+        """
+        r, rscale = getSeriesBase(unitinflow)
+        p, pscale = getSeriesBase(unitdemand)
+        self.__n = len(r)
+        self.__sumr = rscale * r.sum()
+        self.__sump = pscale * p.sum()
+        self.__sumrr = rscale * rscale * np.dot(r, r)
+        self.__sumrp = rscale * pscale * np.dot(r, p)
+        self.__sumpp = pscale * pscale * np.dot(p, p)
+
+    def getSupply(self, catchments):
+        """Returns the total inflow of each catchment area"""
+        return self.__sumr * np.asarray(catchments, dtype=float)
+
+    def getDemand(self, demands):
+        """Returns the total demand of each annual demand"""
+        return self.__sump * np.asarray(demands, dtype=float)
+
+    def getRMSE(self, catchments, demands):
+        """Returns the RMSE between inflow and demand (see calcRMSE()) of each pair of catchment area and annual
+        demand"""
+        a = np.asarray(catchments, dtype=float)
+        b = np.asarray(demands, dtype=float)
+        ssd = a*a*self.__sumrr - 2*a*b*self.__sumrp + b*b*self.__sumpp
+        return np.sqrt(np.maximum(ssd, 0.0)/self.__n)      #ssd >= 0, remove round-off
+
+def getSeriesBase(series):
+    """Returns the base array and scale of a ubseries.ScaledSeries, or a list as an array with scale 1"""
+    if isinstance(series, ubseries.ScaledSeries):
+        return series.getBase(), series.getScale()
+    return np.asarray(series, dtype=float), 1.0
+
+def loglogSWHEquationBatch(city, targetrel, moments, catchments, demands):
+    """Vectorised loglogSWHEquation() for arrays of catchment areas [sqm] and annual demands [kL/yr] whose inflow
+    and demand series are scaled copies of the unit series summarised by the SWHSeriesMoments 'moments'. Returns
+    an array of storage sizes [% of average annual inflow]."""
+    if targetrel > 95:
+        targetrel = 95  #Warning, model not cut out to predict for reliabilities beyond 95%
+    dvavg = calcDVavg(moments.getSupply(catchments), moments.getDemand(demands))
+    rmse = moments.getRMSE(catchments, demands)
+    coefficients = getModelCoefficients(city)
+
+    #Apply the model
+    #   Vol = Rel ^ u * (dvAvg+1) ^ v * RMSE ^ w * 10 ^ const
+    storagevol = (targetrel**coefficients[0])*((dvavg+1)**coefficients[1])*(rmse**coefficients[2])*(10**coefficients[3])
+    return storagevol
+
 ### ------------------------------------------------------------------------ ###    
 
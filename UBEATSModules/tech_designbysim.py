@@ -22,12 +22,22 @@ You should have received a copy of the GNU General Public License
 along with this program; if not, write to the Free Software
 Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """
+import collections, hashlib, os, time
+from itertools import izip
 import numpy as np
+import ubseriesread as ubseries
 
 ### ------------------------------------------------------------------------ ###
 ###     SUBFUNCTIONS FOR STORAGE-BEHAVIOUR SIMULATION                        ###
 ### ------------------------------------------------------------------------ ###
 
+SIM_VOLUME_GRID = 64        #Number of log-spaced volumes of the first pass when building a ReliabilityCurve
+SIM_MAX_SUBDIVISIONS = 16   #Maximum number of new volumes placed in one interval of the curve per refinement pass
+SIM_VOLUME_TOLERANCE = 0.01 #Relative width of the volume bracket at which the bisection of estimateStoreVolume() stops
+SIM_CHECK_INTERVAL = 365   #Time steps between checks of the bounds of checkTankReliability()
+SIM_DECISION_SLACK = 1e-9   #Relative margin on the target supply of a bounded simulation, covers round-off in the sums
+SIM_VECTOR_MIN_VOLUMES = 24 #Fewest volumes for which StorageSimulation updates all stores in lock-step with NumPy
+
 def estimateStoreVolume(inflowseries, demandseries, targetrel, estTol, maxiter):
     """Storage-behaviour model to size an optimum system size based on the inflow
     and outflow timeseries input to the model.
@@ -35,9 +45,16 @@ def estimateStoreVolume(inflowseries, demandseries, targetrel, estTol, maxiter):
         - inflowseries: single-dimensional list of inflow into tanke
         - demandseries: a single-dimensional list of demand values
         - targetrel: the target reliability to be achieved
-        - estTol: the tolerance level acceptable
+        - estTol: the tolerance level acceptable, a target that even the largest store misses by less than
+                    this is sized for 'targetrel' - 'estTol' instead
         - maxiter: maximum number of iterations permissible before an 
                     interpolation is done, prevent computational explosion
+    The store is sized by bisection on volume on every call, so the result only depends on the arguments. Each
+    step only needs to know whether the volume meets the target, which the bounded checkTankReliability()
+    answers without simulating the whole series. Returns the smallest volume found to meet the target once the
+    bracket is narrower than SIM_VOLUME_TOLERANCE of it, or np.inf if no store can. The series may also be
+    ubseries.ScaledSeries views. To size the same series for many target reliabilities, use its ReliabilityCurve
+    instead (see getReliabilityCurve()).
     """
     if len(inflowseries) != len(demandseries):
         #print "Error, inflow/demand time series must be of the same time step"
@@ -45,41 +62,396 @@ def estimateStoreVolume(inflowseries, demandseries, targetrel, estTol, maxiter):
     
     if targetrel > 95:
         targetrel = 95  #cannot be greater than 95% for convergence reasons
-    
+
+    totalinflow = float(ubseries.sumSeries(inflowseries))
+    inflowseries = ubseries.getSeriesList(inflowseries)
+    demandseries = ubseries.getSeriesList(demandseries)
+
     #Estimate an initial storage volume to begin
     days = len(inflowseries)
     years = days/365
-    volest = (sum(inflowseries)/years) / 2      #Begin at 50% of average annual inflow
-    #Initialize bounding volumes and reliabilities
-    lowervol, lowerrel = 0,0
-    uppervol, upperrel = sum(inflowseries), 100
-    
-    #Iterate to find optimum storage volume (Bisection)
-    relTol = upperrel - lowerrel        #reliability range tolerance
-    iterationcount = 0
-    while estTol < relTol and iterationcount < maxiter: # or volestdiff > 0.0001:   #keep looping until the relTol is less than estTol
+    volest = min((totalinflow/years) / 2, totalinflow)      #Begin at 50% of average annual inflow
+    #Initialize bounding volumes, the upper volume always meets the target, the lower never does
+    lowervol = 0.0
+    uppervol = totalinflow
+    if checkTankReliability(inflowseries, demandseries, volest, targetrel):
+        uppervol = volest
+    else:
+        lowervol = volest
+        #A store of the total inflow never spills, if it misses the target no store meets it
+        if not checkTankReliability(inflowseries, demandseries, totalinflow, targetrel):
+            targetrel = targetrel - estTol
+            if not checkTankReliability(inflowseries, demandseries, totalinflow, targetrel):
+                return np.inf   #Cannot find a store with that reliability, return infinity
+            lowervol = 0.0      #the lower target may be met below the first estimate
+
+    #Iterate to find optimum storage volume (Bisection), stores are often far smaller than the first estimate,
+    #so until a volume misses the target the upper volume is quartered instead of halved
+    iterationcount = 1
+    while uppervol - lowervol > SIM_VOLUME_TOLERANCE * uppervol and iterationcount < maxiter:
         iterationcount += 1
-        currel = calculateTankReliability(inflowseries, demandseries, volest)
-        if currel > targetrel:
+        if lowervol == 0:
+            volest = uppervol/4
+        else:
+            volest = (uppervol + lowervol)/2
+        if checkTankReliability(inflowseries, demandseries, volest, targetrel):
             uppervol = volest
-            upperrel = currel
-        elif currel < targetrel:
+        else:
             lowervol = volest
-            lowerrel = currel
-        volest = (uppervol + lowervol)/2     #if est. Rel is larger than target, halve volume
-        relTol = upperrel - lowerrel    #recalculate reliability difference to check against tolerance
-        
-    #print "Total Iterations Needed: ", iterationcount
-    #End of loop, we have bounding volumes and reliability, linearly interpolate
-    storageVol = linearInterpolate(lowervol, uppervol, lowerrel, upperrel, targetrel)
-    #print "Final Volume: ", storageVol    
-    storageREL = calculateTankReliability(inflowseries, demandseries, storageVol)
-    #print "Final Reliability: ", storageREL, "%"
-    
-    if abs(targetrel - storageREL) > 1: #within +/- 2% reliability accuracy
-        return np.inf   #Cannot find a store with that reliability, return infinity
-    return storageVol
-    
+    return uppervol
+
+class ReliabilityCurve(object):
+    def __init__(self, inflowseries, demandseries, tolerance, maxpasses):
+        """The reliability of a store as a function of its volume for the given inflow and demand series. The curve
+        is simulated once on a set of volume breakpoints, which are refined until linear interpolation between
+        neighbouring breakpoints is accurate to 'tolerance' [% reliability] or 'maxpasses' simulation passes were
+        run. Reliability never decreases with volume, so the difference in reliability between two breakpoints
+        bounds the interpolation error in between.
+            - inflowseries, demandseries: single-dimensional lists (or ubseries.ScaledSeries views) of inflow
+                    and demand of the same length
+            - tolerance: acceptable interpolation error [%]
+            - maxpasses: maximum number of simulation passes
+        """
+        maxvolume = float(ubseries.sumSeries(inflowseries))        #a store of the total inflow never spills
+        volumes = np.concatenate([[0.0], maxvolume * np.logspace(-4, 0, SIM_VOLUME_GRID)])
+        reliabilities = calculateTankReliabilityMulti(inflowseries, demandseries, volumes)
+        passes = 1
+        while passes < maxpasses:
+            #Subdivide intervals exceeding the tolerance, assuming reliability is about linear within them
+            gaps = np.diff(reliabilities)
+            refine = np.flatnonzero(gaps > tolerance)
+            if len(refine) == 0:
+                break
+            newvolumes = []
+            for i in refine:
+                pieces = min(int(np.ceil(gaps[i] / tolerance)), SIM_MAX_SUBDIVISIONS)
+                newvolumes.append(np.linspace(volumes[i], volumes[i+1], pieces + 1)[1:-1])
+            newvolumes = np.concatenate(newvolumes)
+            newreliabilities = calculateTankReliabilityMulti(inflowseries, demandseries, newvolumes)
+            volumes = np.concatenate([volumes, newvolumes])
+            reliabilities = np.concatenate([reliabilities, newreliabilities])
+            order = np.argsort(volumes, kind='mergesort')
+            volumes = volumes[order]
+            reliabilities = reliabilities[order]
+            passes += 1
+
+        self.__volumes = volumes
+        self.__reliabilities = np.maximum.accumulate(reliabilities)     #remove round-off, keep the curve monotone
+        self.__passes = passes
+        self.__tolerance = tolerance
+
+    def getReliability(self, volume):
+        """Returns the interpolated reliability [%] of a store of the given volume"""
+        return float(np.interp(volume, self.__volumes, self.__reliabilities))
+
+    def getVolume(self, targetrel):
+        """Returns the smallest volume that achieves the target reliability [%] by inverse interpolation. As in
+        estimateStoreVolume(), a target that the highest reliability of any store misses by less than the tolerance
+        is sized for the target minus the tolerance, if it misses it by more, np.inf is returned."""
+        if targetrel > self.__reliabilities[-1]:
+            targetrel = targetrel - self.__tolerance
+            if targetrel > self.__reliabilities[-1]:
+                return np.inf   #Cannot find a store with that reliability, return infinity
+        index = int(np.searchsorted(self.__reliabilities, targetrel, side='left'))
+        if index == 0:
+            return float(self.__volumes[0])
+        return float(linearInterpolate(self.__volumes[index-1], self.__volumes[index],
+                                       self.__reliabilities[index-1], self.__reliabilities[index], targetrel))
+
+    def getMaxError(self):
+        """Returns the bound on the interpolation error of the curve [% reliability]"""
+        return float(np.diff(self.__reliabilities).max())
+
+    def getBreakpoints(self):
+        return self.__volumes, self.__reliabilities
+
+    def getPasses(self):
+        return self.__passes
+
+RELIABILITY_CURVES = collections.OrderedDict()     #Curves built so far {(series digest, tolerance) : curve}
+RELIABILITY_CURVES_MAX = 256
+
+def getReliabilityCurve(inflowseries, demandseries, tolerance, maxpasses):
+    """Returns the ReliabilityCurve of the inflow and demand series, only building it if the same series have not
+    been simulated before with this tolerance. Repeated sizing of the same store for other target reliabilities
+    therefore needs no new simulations. The least recently used curves are dropped beyond RELIABILITY_CURVES_MAX."""
+    key = (getSeriesDigest(inflowseries, demandseries), float(tolerance), maxpasses)
+    if key in RELIABILITY_CURVES:
+        curve = RELIABILITY_CURVES.pop(key)      #re-insert to mark as most recently used
+    else:
+        curve = ReliabilityCurve(inflowseries, demandseries, tolerance, maxpasses)
+    RELIABILITY_CURVES[key] = curve
+    while len(RELIABILITY_CURVES) > RELIABILITY_CURVES_MAX:
+        RELIABILITY_CURVES.popitem(last=False)
+    return curve
+
+def clearReliabilityCurves():
+    RELIABILITY_CURVES.clear()
+    return True
+
+def getSeriesDigest(*series):
+    """Returns an md5 hex digest identifying the values of the input time series. ScaledSeries views are
+    identified by their base array and scale, without building the scaled series."""
+    digest = hashlib.md5()
+    for data in series:
+        if isinstance(data, ubseries.ScaledSeries):
+            digest.update(np.ascontiguousarray(data.getBase()).tostring())
+            digest.update(repr(data.getScale()))
+        else:
+            digest.update(np.asarray(data, dtype=float).tostring())
+    return digest.hexdigest()
+
+def quantiseValue(value, quantisation, roundup):
+    """Rounds a positive value onto a logarithmic grid of relative width 'quantisation' (e.g. 0.01 = 1%), up to
+    the next grid value if roundup is True, otherwise down. Values are returned unchanged if quantisation <= 0."""
+    if quantisation <= 0 or value <= 0:
+        return float(value)
+    step = np.log(1.0 + quantisation)
+    position = round(np.log(value) / step, 9)        #round() keeps exact grid values in place
+    if roundup:
+        return float(np.exp(np.ceil(position) * step))
+    return float(np.exp(np.floor(position) * step))
+
+class StorageSizingCache(object):
+    def __init__(self, quantisation):
+        """Scale-normalised cache of store volumes. If the inflow is a unit inflow pattern times the harvested area
+        and the demand a unit demand pattern times the annual demand, the reliability of a store only depends on
+        the ratios volume/area and demand/area. Volumes are therefore cached per unit area [kL/sqm] under the key
+        (pattern, demand-to-area ratio bucket, target reliability) and reused for every area and demand of the
+        same ratio bucket.
+            - quantisation: relative width of the ratio buckets, e.g. 0.01 = 1%. Ratios are rounded up to the
+                    next bucket, which demands more from the store and therefore never undersizes it. If <= 0,
+                    ratios are not quantised and only identical ratios are reused.
+        """
+        self.__quantisation = float(quantisation)
+        self.__patterns = {}        #{pattern ID : [unit inflow series, unit demand series]}
+        self.__volumes = {}         #{(pattern ID, ratio bucket, target, tolerance, maxiter) : volume per unit area}
+        self.__hits = 0
+        self.__misses = 0
+        self.__maxratioerror = 0.0
+        self.__collecting = False
+        self.__jobs = collections.OrderedDict()     #{key : sizing job} of misses seen while collecting
+
+    def setPattern(self, patternid, unitinflow, unitdemand):
+        """Registers the inflow series of one unit of harvested area [kL/sqm] and the demand series of one unit
+        of annual demand [kL/kL] under the ID 'patternid', both as ubseries.ScaledSeries views."""
+        self.__patterns[patternid] = [unitinflow, unitdemand]
+
+    def hasPattern(self, patternid):
+        return patternid in self.__patterns
+
+    def getPatterns(self):
+        return self.__patterns
+
+    def setCollecting(self, collecting):
+        """While collecting, misses are not simulated but recorded as sizing jobs (see getJobs()) and np.inf is
+        returned. Used to gather all simulations of a run up front and run them in parallel."""
+        self.__collecting = collecting
+
+    def getBucketRatio(self, demandratio):
+        """Returns the ratio the demand-to-area ratio is rounded up to"""
+        return quantiseValue(demandratio, self.__quantisation, True)
+
+    def estimateStoreVolume(self, patternid, demandratio, Aharvest, targetrel, estTol, maxiter):
+        """Returns the store volume for a harvested area 'Aharvest' [sqm] supplying an annual demand of
+        demandratio * Aharvest [kL/yr] with the pattern 'patternid'. Only the first request of each ratio bucket
+        runs estimateStoreVolume(), all others scale the cached unit volume. Returns False or np.inf as
+        estimateStoreVolume() does if the store cannot be sized."""
+        bucketratio = self.getBucketRatio(demandratio)
+        if demandratio > 0:
+            self.__maxratioerror = max(self.__maxratioerror, bucketratio / demandratio - 1.0)
+        key = (patternid, bucketratio, targetrel, estTol, maxiter)
+        if self.__collecting:
+            if key not in self.__volumes:
+                self.__jobs[key] = ["store", key, [patternid, bucketratio, targetrel, estTol, maxiter]]
+            return np.inf
+        if key in self.__volumes:
+            self.__hits += 1
+        else:
+            self.__misses += 1
+            unitinflow, unitdemand = self.__patterns[patternid]
+            self.__volumes[key] = sizeUnitStore(unitinflow, unitdemand, bucketratio, targetrel, estTol, maxiter)
+        unitvolume = self.__volumes[key]
+        if unitvolume is False or unitvolume == np.inf:
+            return unitvolume
+        return unitvolume * Aharvest
+
+    def getJobs(self):
+        """Returns and forgets the sizing jobs collected so far, see runSizingJobs()"""
+        jobs = self.__jobs.values()
+        self.__jobs = collections.OrderedDict()
+        return jobs
+
+    def setVolume(self, key, unitvolume):
+        self.__volumes[key] = unitvolume
+
+    def getMaxRatioError(self):
+        """Returns the largest relative amount a demand ratio was rounded up by so far, the bound on the
+        overestimation of the demand the cached stores were sized for."""
+        return self.__maxratioerror
+
+    def getStats(self):
+        """Returns the number of cache hits, misses (simulations), cached volumes, the hit rate and the
+        largest relative rounding of a demand ratio."""
+        requests = self.__hits + self.__misses
+        hitrate = 0.0
+        if requests:
+            hitrate = float(self.__hits) / requests
+        return {"hits": self.__hits, "misses": self.__misses, "size": len(self.__volumes),
+                "hitrate": hitrate, "maxratioerror": self.__maxratioerror}
+
+    def clear(self):
+        self.__volumes = {}
+        self.__hits = 0
+        self.__misses = 0
+        self.__maxratioerror = 0.0
+
+class LotTankMemo(object):
+    def __init__(self, tolerance):
+        """Memo of lot-scale tank sizes shared by all Blocks. Many Blocks have the same roof area, demand and end
+        uses, so their tanks are only sized once. The key is the quantised roof area and annual demand together
+        with the end uses, climate series ID, reliability target and any other settings the size depends on.
+            - tolerance: relative width of the quantisation of roof area and demand, e.g. 0.01 = 1%. The roof
+                    area is rounded down and the demand up, so tanks are sized for a slightly harder case and
+                    are never too small. If <= 0, only identical values are reused.
+        """
+        self.__tolerance = float(tolerance)
+        self.__volumes = {}
+        self.__hits = 0
+        self.__misses = 0
+        self.__collecting = False
+        self.__jobs = collections.OrderedDict()     #{key : sizing job} of misses seen while collecting
+
+    def getKey(self, Aroof, demand, enduses, climateid, targetrel, *settings):
+        """Returns the memo key and the quantised roof area [sqm] and annual demand [kL/yr] the tank should be
+        sized for on a memo miss."""
+        Aroof_q = quantiseValue(Aroof, self.__tolerance, False)
+        demand_q = quantiseValue(demand, self.__tolerance, True)
+        key = (Aroof_q, demand_q, tuple(sorted(enduses)), climateid, targetrel) + tuple(settings)
+        return key, Aroof_q, demand_q
+
+    def setCollecting(self, collecting):
+        """While collecting, callers record memo misses with addJob() instead of sizing the tank"""
+        self.__collecting = collecting
+
+    def isCollecting(self):
+        return self.__collecting
+
+    def addJob(self, key, jobargs):
+        """Records the arguments of a "lot" sizing job (see runSizingJob()) for a memo miss"""
+        self.__jobs[key] = ["lot", key, jobargs]
+
+    def getJobs(self):
+        """Returns and forgets the sizing jobs collected so far, see runSizingJobs()"""
+        jobs = self.__jobs.values()
+        self.__jobs = collections.OrderedDict()
+        return jobs
+
+    def getVolume(self, key):
+        """Returns the memoised tank volume of the key or None if the tank has not been sized yet"""
+        if self.__collecting:
+            return self.__volumes.get(key)
+        if key in self.__volumes:
+            self.__hits += 1
+            return self.__volumes[key]
+        self.__misses += 1
+        return None
+
+    def setVolume(self, key, volume):
+        self.__volumes[key] = volume
+
+    def getStats(self):
+        """Returns the number of memo hits, misses, memoised tanks and the hit rate"""
+        requests = self.__hits + self.__misses
+        hitrate = 0.0
+        if requests:
+            hitrate = float(self.__hits) / requests
+        return {"hits": self.__hits, "misses": self.__misses, "size": len(self.__volumes), "hitrate": hitrate}
+
+    def clear(self):
+        self.__volumes = {}
+        self.__hits = 0
+        self.__misses = 0
+
+def sizeUnitStore(unitinflow, unitdemand, demandratio, targetrel, estTol, maxiter):
+    """Returns the store volume per unit area [kL/sqm] for the unit inflow pattern supplying 'demandratio' times
+    the unit demand pattern, see StorageSizingCache."""
+    return estimateStoreVolume(unitinflow, unitdemand.getScaled(demandratio), targetrel, estTol, maxiter)
+
+def sizeTankFromTemplates(unitinflow, unitdemand, Aroof, recdemand, tank_templates, targetrel):
+    """Returns the smallest of the ascending 'tank_templates' that supplies the annual demand 'recdemand' [kL/yr]
+    from a roof 'Aroof' [sqm] at a reliability above 'targetrel', or np.inf if none does. The tanks are checked
+    smallest first with the bounded checkTankReliability(), stopping at the first that meets the target.
+        - unitinflow, unitdemand: unit patterns of the storage sizing cache (see StorageSizingCache.setPattern())
+    """
+    inflowseries = unitinflow.getScaled(Aroof).toList()
+    demandseries = unitdemand.getScaled(recdemand).toList()
+    for volume in tank_templates:       #Smallest tank first
+        if checkTankReliability(inflowseries, demandseries, volume, targetrel):
+            return volume
+    return np.inf
+
+SIZING_WORKER = {}      #Read-only unit patterns of a sizing process, see initSizingWorker()
+SIZING_JOB_TIMEOUT = 600  #Seconds the sizing pool may go without finishing a job before it is given up
+
+def initSizingWorker(patterns):
+    """Hands the unit patterns to the sizing jobs of the current process. Pool processes are forked after this
+    data exists, so they share it read-only instead of receiving a copy with every job."""
+    SIZING_WORKER["patterns"] = patterns
+
+def runSizingJob(job):
+    """Runs a single sizing job [type, key, arguments] and returns [type, key, volume, seconds]. Jobs of type
+    "store" size a unit store with sizeUnitStore(), jobs of type "lot" a lot tank with sizeTankFromTemplates()."""
+    starttime = time.time()
+    jobtype, key, args = job
+    unitinflow, unitdemand = SIZING_WORKER["patterns"][args[0]]
+    if jobtype == "store":
+        volume = sizeUnitStore(unitinflow, unitdemand, *args[1:])
+    elif jobtype == "lot":
+        volume = sizeTankFromTemplates(unitinflow, unitdemand, *args[1:])
+    return [jobtype, key, volume, time.time() - starttime]
+
+def runSizingJobs(jobs, patterns, processes):
+    """Runs a list of sizing jobs (see runSizingJob()) serially if 'processes' is 1, otherwise on a pool of that
+    many processes, or all CPUs if 0. Jobs also run serially if there are less than two jobs or if processes
+    cannot be forked on this platform. If the pool fails or no job finishes within SIZING_JOB_TIMEOUT, e.g. because
+    a worker died, the pool is terminated and the remaining jobs run serially.
+    Returns the list of job results and a dictionary of timing statistics: job count, processes used, wall time,
+    summed job time, mean and longest job time and the speed-up (summed job time / wall time) [s]."""
+    starttime = time.time()
+    results = []
+    usedprocesses = 1
+    if processes != 1 and len(jobs) > 1 and os.name == "posix":
+        pool = None
+        try:
+            import multiprocessing
+            if processes < 1:
+                processes = multiprocessing.cpu_count()
+            pool = multiprocessing.Pool(min(processes, len(jobs)), initSizingWorker, (patterns,))
+            jobresults = pool.imap(runSizingJob, jobs, 1)
+            for i in range(len(jobs)):
+                results.append(jobresults.next(SIZING_JOB_TIMEOUT))
+            usedprocesses = min(processes, len(jobs))
+        except Exception, e:
+            print "Parallel storage sizing failed ("+(str(e) or type(e).__name__)+"), sizing "+\
+                  str(len(jobs) - len(results))+" remaining jobs serially"
+        finally:
+            if pool is not None:
+                pool.terminate()
+    if len(results) < len(jobs):
+        initSizingWorker(patterns)
+        results.extend([runSizingJob(job) for job in jobs[len(results):]])
+    walltime = time.time() - starttime
+    jobtimes = [result[3] for result in results]
+    stats = {"jobs": len(jobs), "processes": usedprocesses, "walltime": walltime, "jobtime": sum(jobtimes),
+             "meanjobtime": 0.0, "maxjobtime": 0.0, "speedup": 1.0}
+    if len(jobtimes) != 0:
+        stats["meanjobtime"] = sum(jobtimes) / len(jobtimes)
+        stats["maxjobtime"] = max(jobtimes)
+    if walltime > 0:
+        stats["speedup"] = sum(jobtimes) / walltime
+    return results, stats
+
 def calculateTankReliability(inflowseries, demandseries, volume):
     """Runs a storage-behaviour simulation (Yield after spill order) and returns
     the reliability of the input volume
@@ -105,6 +477,148 @@ def calculateTankReliability(inflowseries, demandseries, volume):
         cumusupply += supplyfromtank
     return cumusupply/cumudemand * 100
 
+def checkTankReliability(inflowseries, demandseries, volume, targetrel):
+    """Bounded version of calculateTankReliability(), returns True if the store achieves a reliability above
+    'targetrel' [%] and False otherwise. The simulation stops as soon as the supply exceeds the target share of the
+    total demand or the shortfall exceeds the rest, after which the outcome cannot change. The bounds are checked
+    every SIM_CHECK_INTERVAL time steps, which keeps the loop over the time steps as short as that of an unbounded
+    simulation."""
+    cV = 0.0    #current Volume in store set to zero at start
+    volume = float(volume)
+    cumudemand = sum(demandseries)
+    targetsupply = targetrel / 100.0 * cumudemand
+    maxshortfall = (cumudemand - targetsupply) * (1 + SIM_DECISION_SLACK)   #the store fails once it misses more
+    targetsupply = targetsupply * (1 + SIM_DECISION_SLACK)                  #demand than this
+    cumusupply = 0.0
+    cumushortfall = 0.0
+    for start in range(0, len(inflowseries), SIM_CHECK_INTERVAL):
+        demandblock = demandseries[start:start+SIM_CHECK_INTERVAL]
+        supplied = 0.0
+        for inflow, todaydemand in izip(inflowseries[start:start+SIM_CHECK_INTERVAL], demandblock):
+            cV += inflow    #add inflow
+
+            #YIELD AFTER SPILL (YAS)
+            if cV > volume:
+                cV = volume
+
+            if todaydemand < cV:
+                supplyfromtank = todaydemand
+            else:
+                supplyfromtank = cV
+            cV -= supplyfromtank
+            supplied += supplyfromtank
+        cumusupply += supplied
+        cumushortfall += sum(demandblock) - supplied
+        if cumusupply > targetsupply:
+            return True
+        if cumushortfall >= maxshortfall:
+            return False
+    return cumusupply/cumudemand * 100 > targetrel
+
+def calculateTankReliabilityMulti(inflowseries, demandseries, volumes):
+    """Runs the storage-behaviour simulation of calculateTankReliability() for several store volumes at once. The
+    time series is walked once and the stores of all volumes are updated in lock-step.
+        - inflowseries: a single-dimensional list (or ubseries.ScaledSeries view) of all inflows
+        - demandseries: a single-dimensional list (or ubseries.ScaledSeries view) of all demands for that timestep
+        - volumes: array of store volumes
+    Returns an array with the reliability [%] of each volume.
+    """
+    return calculateTankReliabilityChunked(ubseries.iterateSeriesChunks(inflowseries),
+                                           ubseries.iterateSeriesChunks(demandseries), volumes)
+
+def calculateTankReliabilityChunked(inflowchunks, demandchunks, volumes):
+    """Runs the storage-behaviour simulation of calculateTankReliabilityMulti() on time series supplied in chunks,
+    e.g. by the generators in ubseriesread. Only one chunk of each series is held in memory at a time, the state
+    of the stores is carried from chunk to chunk.
+        - inflowchunks, demandchunks: iterables of inflow and demand chunks, the n-th chunks of both must be of
+                    the same length
+        - volumes: array of store volumes
+    Returns an array with the reliability [%] of each volume or False if the chunks do not match.
+    """
+    simulation = StorageSimulation(volumes)
+    demandchunks = iter(demandchunks)
+    for inflowchunk in inflowchunks:
+        demandchunk = next(demandchunks, None)
+        if demandchunk is None or not simulation.addChunk(inflowchunk, demandchunk):
+            return False
+    if next(demandchunks, None) is not None:
+        return False
+    return simulation.getReliability()
+
+class StorageSimulation(object):
+    def __init__(self, volumes):
+        """Yield-after-spill storage-behaviour simulation of stores of several volumes that is fed the inflow and
+        demand series one chunk at a time. The stores start empty, their content and the cumulative demand and
+        supply are carried over between chunks.
+            - volumes: array of store volumes
+        """
+        self.__volumes = np.asarray(volumes, dtype=float)
+        self.__volumelist = self.__volumes.tolist()       #plain floats for the per-volume loop
+        self.__cV = np.zeros(self.__volumes.shape)         #current Volume in each store set to zero at start
+        self.__cumusupply = np.zeros(self.__volumes.shape)
+        self.__cumudemand = 0.0
+        self.__timesteps = 0
+
+    def addChunk(self, inflowchunk, demandchunk):
+        """Simulates the next chunk of the inflow and demand series, returns False if the chunks are not of the
+        same length"""
+        if len(inflowchunk) != len(demandchunk):
+            return False
+        self.__simulate(inflowchunk, demandchunk)
+        return True
+
+    def __simulate(self, inflowchunk, demandchunk):
+        """Every time step of the lock-step kernel costs several NumPy calls, whose overhead outweighs the work on
+        a short volume vector. Below SIM_VECTOR_MIN_VOLUMES volumes, each volume is simulated in turn with plain
+        floats instead, which is faster up to about that many volumes."""
+        if len(self.__volumelist) < SIM_VECTOR_MIN_VOLUMES:
+            self.__simulateEach(inflowchunk, demandchunk)
+        else:
+            self.__simulateLockStep(inflowchunk, demandchunk)
+        self.__cumudemand += sum(demandchunk)
+        self.__timesteps += len(inflowchunk)
+
+    def __simulateEach(self, inflowchunk, demandchunk):
+        cV = self.__cV
+        cumusupply = self.__cumusupply
+        for j in range(len(self.__volumelist)):
+            volume = self.__volumelist[j]
+            storage = float(cV[j])
+            supplied = 0.0
+            for inflow, demand in izip(inflowchunk, demandchunk):
+                storage += inflow   #add inflow
+                if storage > volume:
+                    storage = volume    #YIELD AFTER SPILL (YAS)
+                if demand < storage:
+                    supplyfromtank = demand
+                else:
+                    supplyfromtank = storage
+                storage -= supplyfromtank
+                supplied += supplyfromtank
+            cV[j] = storage
+            cumusupply[j] += supplied
+
+    def __simulateLockStep(self, inflowchunk, demandchunk):
+        volumes = self.__volumes
+        cV = self.__cV
+        cumusupply = self.__cumusupply
+        supplyfromtank = np.zeros(volumes.shape)
+        for inflow, demand in izip(inflowchunk, demandchunk):
+            if inflow != 0:
+                cV += inflow   #add inflow
+                np.minimum(cV, volumes, out=cV)     #YIELD AFTER SPILL (YAS)
+
+            np.minimum(demand, cV, out=supplyfromtank)
+            cV -= supplyfromtank
+            cumusupply += supplyfromtank
+
+    def getReliability(self):
+        """Returns an array with the reliability [%] of each volume over all chunks simulated so far"""
+        return self.__cumusupply/self.__cumudemand * 100
+
+    def getTimeSteps(self):
+        return self.__timesteps
+
 ### ------------------------------------------------------------------------ ###     
 
 def linearInterpolate(y0, y1, x0, x1, x):
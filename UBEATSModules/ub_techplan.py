@@ -535,10 +535,14 @@ class UB_Techplan(Module):
             self.evapfile = "MelbourneEvap1998-2007-Day.csv"
             self.createParameter("evap_dt", DOUBLE, "")
             self.evap_dt = 1440     #[mins]
+            self.createParameter("climate_cache", BOOL, "")
+            self.climate_cache = 1  #keep parsed climate series in ancillary/climatecache for later runs?
             self.lot_raintanksizes = [1,2,3,4,5,7.5,10,15,20]       #[kL]
             self.raindata = []      #Globals to contain the data time series
             self.evapdata = []
             self.evapscale = []
+            self.climateid = ""     #Digest of the climate data, identifies it in memo keys
+            self.climateloaded = False      #Climate data is loaded on first use, see getClimateData()
             self.sysdepths = {}     #Holds all calculated system depths
 
             self.swhbenefitstable = []
@@ -548,6 +552,20 @@ class UB_Techplan(Module):
             self.relTolerance = 1
             self.maxSBiterations = 100
 
+            self.createParameter("dcvgrid_mode", BOOL, "")
+            self.createParameter("dcvgrid_res", DOUBLE, "")
+            self.dcvgrid_mode = 0       #interpolate designs from a dense ksat grid instead of the exact curves?
+            self.dcvgrid_res = 0.1      #resolution of the ksat grid [mm/hr]
+
+            self.createParameter("sb_ratioquant", DOUBLE, "")
+            self.sb_ratioquant = 0.01   #relative width of the demand-to-area ratio buckets of the storage sizing cache
+
+            self.createParameter("lot_memotol", DOUBLE, "")
+            self.lot_memotol = 0.01     #relative quantisation of roof area and demand when reusing lot tank sizes between Blocks
+
+            self.createParameter("sizing_processes", DOUBLE, "")
+            self.sizing_processes = 1   #processes for the store sizing pre-pass, 1 = serial, >1 = pool of that many, 0 = all CPUs
+
             self.createParameter("maxMCiterations", DOUBLE, "")
             self.maxMCiterations = 1000
 
@@ -585,6 +603,7 @@ class UB_Techplan(Module):
 
             self.blockDict = {}
             self.blockIDlist = []
+            self.dcvpaths = {}
             self.downIDlist = []
 
             self.curscalepref = {"L":0.25, "S":0.25, "N":0.25, "B":0.25}
@@ -738,6 +757,19 @@ class UB_Techplan(Module):
             #--- SECTION ! - Pre-Processing
             ###-------------------------------------------------------------------###
 
+            #CLEAR MEMOISED DESIGNS AND STORE CURVES FROM PREVIOUS RUNS - targets and design curves may have changed
+            dcv.clearDesignMemo()
+            dsim.clearReliabilityCurves()
+            if self.dcvgrid_mode:
+                  dcv.setDesignGridResolution(self.dcvgrid_res)
+            else:
+                  dcv.setDesignGridResolution(None)
+            self.dcvpaths = {}      #Design curve file of each technology, resolved on first use in getDCVPath()
+            self.storagecache = dsim.StorageSizingCache(self.sb_ratioquant)     #Normalised store volumes, see getStorageVolume()
+            self.eqnmoments = {}    #Moments of the unit patterns for the equation method, see getUnitPatternID()
+            self.lottankmemo = dsim.LotTankMemo(self.lot_memotol)       #Lot tank sizes shared by Blocks, see determineStorageVolForLot()
+            self.climateloaded = False      #Re-read the climate settings of this run on first use
+
             #CALCULATE SOME GLOBAL VARIABLES RELATING TO TARGETS
             self.system_tarQ = self.ration_runoff * self.targets_runoff     #Runoff reduction target
             self.system_tarTSS = self.ration_pollute * self.targets_TSS     #TSS reduction target
@@ -857,6 +889,9 @@ class UB_Techplan(Module):
 
             print system_list
 
+            #Evaluate all existing systems against the new targets in one pass, grouped by design curve
+            self.evaluateExistingSystems(system_list)
+
             #Do the retrofitting
             for currentID in self.blockDict.keys():
                   currentAttList = self.blockDict[currentID]
@@ -896,16 +931,15 @@ class UB_Techplan(Module):
             print "Debug", str(self.lot_incr)+" "+str(self.street_incr)+" "+str(self.neigh_incr)+" "+str(self.subbas_incr)
 
 
-                  #---- C.2 - LOAD CLIMATE DATA IF HARVESTING -----------------------
+                  #---- C.1b - DESIGN ALL SOIL TYPES OF THE MAP UPFRONT --------------
+            self.preloadTechDesigns(list(set(techListLot + techListStreet + techListNeigh + techListSubbas)))
+
+                  #---- C.2 - SIZE HARVESTING STORES -------------------------------
 
             if bool(self.ration_harvest):   #if harvest is a management objective
-                  #Initialize meteorological data vectors: Load rainfile and evaporation files,
-                  #create the scaling factors for evap data
-                  print "Loading Climate Data... "
-                  self.raindata = ubseries.loadClimateFile(ANCILLARY_PATH+"/"+self.rainfile, "csv", self.rain_dt, 1440, self.rain_length)
-                  self.evapdata = ubseries.loadClimateFile(ANCILLARY_PATH+"/"+self.evapfile, "csv", self.evap_dt, 1440, self.rain_length)
-                  self.evapscale = ubseries.convertVectorToScalingFactors(self.evapdata)
-                  self.raindata = ubseries.removeDateStampFromSeries(self.raindata)             #Remove the date stamps
+                  #Climate data is loaded by the first store that needs it, see getClimateData()
+                  #Size all harvesting stores of the region up front, the assessment then reads them from the caches
+                  self.prepassStorageSizing(techListLot, techListNeigh, techListSubbas)
 
                   #---- C.3 - BLOCK OPPORTUNITIES ASSESSMENT -------------------------
 
@@ -962,6 +996,13 @@ class UB_Techplan(Module):
 
                   inblock_options["BlockID"+str(currentID)] = self.constructInBlockOptions(currentAttList, lot_techRES, lot_techHDR, lot_techLI, lot_techHI, lot_techCOM, street_tech, neigh_tech)
 
+            print "Design memo statistics: "+str(dcv.getDesignMemoStats())
+            if self.dcvgrid_mode:
+                  print "Design grid statistics: "+str(dcv.getDesignGridStats())
+            print "Storage sizing cache statistics: "+str(self.storagecache.getStats())
+            print "Lot tank memo statistics: "+str(self.lottankmemo.getStats())
+            print "Climate registry statistics: "+str(ubseries.getClimateRegistryStats())
+
             ###-------------------------------------------------------------------###
             #---  SECTION D - MONTE CARLO (ACROSS BASINS)                        ---#
             ###-------------------------------------------------------------------###
@@ -1809,7 +1850,8 @@ class UB_Techplan(Module):
             #Depending on the type of system and classification, will need to retrieve design in different
             #ways
             if wtype in ["BF", "SW", "WSUR", "PB", "IS"]:    #DESIGN by DCV Systems
-                  sys_perc = dcv.retrieveDesign(self.getDCVPath(wtype), wtype, min(ksat, sysexfil), self.targetsvector)
+                  #preloaded for all existing systems by evaluateExistingSystems()
+                  sys_perc = dcv.retrieveDesignCached(self.getDCVPath(wtype), wtype, min(ksat, sysexfil), self.targetsvector)
             #print "Sys Percentage: "+str(sys_perc)
             elif wtype in ["RT", "PP", "ASHP", "GW"]:        #DESIGN by EQN or SIM Systems
                   #Other system types
@@ -1832,6 +1874,34 @@ class UB_Techplan(Module):
             return imptreatedbysystem
 
 
+      def evaluateExistingSystems(self, system_list):
+            """Assesses how well the designs of all existing systems meet the current targets before the
+            retrofit scenarios are run. Systems are grouped by type and design curve and the exfiltration rates of
+            each group are designed with a single batch call through dcv.preloadDesignMemo(), which also tabulates
+            the size fraction grid if dcvgrid_mode is on. retrieveNewAimpTreated() then reads each system's design
+            through dcv.retrieveDesignCached(), the same path designTechnology() uses.
+            """
+            groups = {}     #{(type, dcvpath) : [ksat, ...]}
+            systems = 0
+            for currentID in system_list.keys():
+                  if self.blockDict[currentID]["Status"] == 0:
+                        continue
+                  ksat = self.blockDict[currentID]["Soil_k"]
+                  for sys_descr in system_list[currentID]:
+                        wtype = sys_descr["Type"]
+                        if wtype not in ["BF", "WSUR", "PB", "IS"]:     #only DCV systems, no curves for swales yet
+                              continue
+                        key = (wtype, self.getDCVPath(wtype))
+                        if key not in groups:
+                              groups[key] = []
+                        groups[key].append(min(ksat, sys_descr["Exfil"]))
+                        systems += 1
+
+            for key in groups.keys():
+                  dcv.preloadDesignMemo(key[1], key[0], groups[key], self.targetsvector)
+            print "Existing systems evaluated: "+str(systems)+" in "+str(len(groups))+" groups"
+            return True
+
       def findDCVpath(self, wtype, sys_descr):
             #Finds the correct pathname of the design curve file based on system type and specs
             if wtype in ["IS", "BF"]: #then file = BF-EDDx.xm-FDx.xm.dcv
@@ -1931,8 +2001,8 @@ class UB_Techplan(Module):
             #dcvpath = self.findDCVpath(type, sys_descr)
 
             #Some additional arguments for the design function
-            maxsize = eval("self."+str(wtype)+"maxsize")                     #FUTURE >>>>>> MULTI-oBJECTIVE DESIGN
-            minsize = eval("self."+str(wtype)+"minsize")
+            maxsize = getattr(self, wtype+"maxsize")                     #FUTURE >>>>>> MULTI-oBJECTIVE DESIGN
+            minsize = getattr(self, wtype+"minsize")
             soilK = currentAttList["Soil_k"]
             systemK = sys_descr["Exfil"]
 
@@ -1941,8 +2011,9 @@ class UB_Techplan(Module):
             tech_applications = self.getTechnologyApplications(wtype)
             purpose = [0, tech_applications[1], 0]
 
-            #Call the design function using eval, due to different system Types
-            newdesign = eval('td.design_'+str(wtype)+'('+str(originalAimpTreated)+',"'+str(dcvpath)+'",'+str(self.targetsvector)+','+str(purpose)+','+str(soilK)+','+str(systemK)+','+str(minsize)+','+str(maxsize)+')')
+            #Call the design function of the system type
+            design = td.DESIGN_FUNCTIONS[wtype](originalAimpTreated, dcvpath, self.targetsvector, purpose, soilK, systemK, minsize, maxsize)
+            newdesign = td.getDesignFromArray(design, 0)
 
             Anewsystem = newdesign[0]
             newEAFactor = newdesign[1]
@@ -2003,21 +2074,63 @@ class UB_Techplan(Module):
                   incr_matrix.append(round(float(1.0/float(increment))*(float(i)+1.0),3))
             return incr_matrix
 
+      def preloadTechDesigns(self, techList):
+            """Designs every design-curve based technology in techList for all soil exfiltration rates found in the
+            map with a single batch call per curve and purpose. The results are held in the design memo, so that the
+            design functions of the opportunities assessment only look them up.
+            """
+            soilKs = []
+            for currentID in self.blockDict.keys():
+                  if self.blockDict[currentID]["Status"] == 0 or self.blockDict[currentID]["Soil_k"] == 0:
+                        continue        #design functions do not look up the curve for impermeable soils
+                  soilKs.append(self.blockDict[currentID]["Soil_k"])
+            if len(soilKs) == 0:
+                  return True
+
+            for j in techList:
+                  if j not in ["BF", "IS", "WSUR", "PB"]:
+                        continue
+                  dcvpath = self.getDCVPath(j)
+                  systemK = getattr(self, j+"exfil")
+                  tech_applications = self.getTechnologyApplications(j)
+                  purposes = []
+                  if tech_applications[0] == 1:
+                        purposes.append([[1, 0, 0], systemK])
+                  if tech_applications[1] == 1:
+                        purposes.append([[0, 1, 0], systemK])
+                  if tech_applications[2] == 1 and bool(int(self.ration_harvest)):
+                        purposes.append([[0, 1, 0], 0])     #lined system for harvesting, see designTechnology()
+                  for purpose, exfil in purposes:
+                        exfils = np.minimum(soilKs, exfil)
+                        dcv.preloadDesignMemo(dcvpath, j, exfils, td.getDesignTargets(self.targetsvector, purpose))
+            return True
+
       def getDCVPath(self, techType):
             """Retrieves the string for the path to the design curve file, whether it is a custom loaded
-            design curve or the UB default curves.
+            design curve or the UB default curves. Paths are resolved once per run through the design curve
+            registry, curves of other cities than Melbourne are used if they exist for the region.
             """
-            if eval("self."+techType+"designUB"):
+            if techType in self.dcvpaths:
+                  return self.dcvpaths[techType]
+            if getattr(self, techType+"designUB"):
                   if techType in ["BF", "IS"]:
-                        return ANCILLARY_PATH+"/wsudcurves/Melbourne/"+techType+"-EDD"+str(eval("self."+techType+"spec_EDD"))+"m-FD"+str(eval("self."+techType+"spec_FD"))+"m-DC.dcv"
+                        specs = {"EDD": getattr(self, techType+"spec_EDD"), "FD": getattr(self, techType+"spec_FD")}
                   elif techType in ["PB"]:
-                        return ANCILLARY_PATH+"/wsudcurves/Melbourne/"+techType+"-MD"+str(eval("self."+techType+"spec_MD"))+"m-DC.dcv"
+                        specs = {"MD": getattr(self, techType+"spec_MD")}
                   elif techType in ["WSUR"]:
-                        return ANCILLARY_PATH+"/wsudcurves/Melbourne/"+techType+"-EDD"+str(eval("self."+techType+"spec_EDD"))+"m-DC.dcv"
+                        specs = {"EDD": getattr(self, techType+"spec_EDD")}
                   else:
                         return "No DC Located"
+                  registry = dcv.getDesignCurveRegistry(ANCILLARY_PATH+"/wsudcurves")
+                  dcvpath = registry.getCurvePath(self.regioncity, techType, **specs)
+                  if dcvpath is None:
+                        dcvpath = registry.getCurvePath("Melbourne", techType, **specs)     #default UB curves
+                  if dcvpath is None:
+                        dcvpath = "No DC Located"
             else:
-                  return eval("self."+techType+"descur_path")
+                  dcvpath = getattr(self, techType+"descur_path")
+            self.dcvpaths[techType] = dcvpath
+            return dcvpath
 
 
       def getTechnologyApplications(self, j):
@@ -2058,6 +2171,89 @@ class UB_Techplan(Module):
             return purposes
 
 
+      def getClimateData(self):
+            """Returns the rainfall series [mm/day] and the evaporation scaling factors used to size
+            harvesting stores. The climate files are only loaded when the first store is sized, Blocks
+            without roof area, demand or space never need them. The parsed series are held in the
+            process-level climate registry (see ubseries.getClimateSeries()), so module instances and
+            repeated runs with the same files, timesteps and number of years share them."""
+            if self.climateloaded:
+                  return self.raindata, self.evapscale
+            print "Loading Climate Data... "
+            rainformat = ubseries.getClimateFileType(self.rainfile)     #csv, ixx or mse, csv for other extensions
+            evapformat = ubseries.getClimateFileType(self.evapfile)
+            rainseries = ubseries.getClimateSeries(ANCILLARY_PATH+"/"+self.rainfile, rainformat, self.rain_dt, 1440,
+                                                   self.rain_length, bool(self.climate_cache))
+            evapseries = ubseries.getClimateSeries(ANCILLARY_PATH+"/"+self.evapfile, evapformat, self.evap_dt, 1440,
+                                                   self.rain_length, bool(self.climate_cache))
+            self.raindata = rainseries.getValues().tolist()     #Series without date stamps
+            self.evapscale = evapseries.getScalingFactors().toList()
+            self.climateid = dsim.getSeriesDigest(self.raindata, self.evapscale)           #Identifies the climate series in memo keys
+            self.climateloaded = True
+            return self.raindata, self.evapscale
+
+      def prepassStorageSizing(self, techListLot, techListNeigh, techListSubbas):
+            """Sizes the harvesting stores of all Blocks before the opportunities assessment. The storage sizing
+            functions of each scale are first run with the storage sizing cache and lot tank memo collecting, which
+            records every distinct simulation the assessment will need as a job. The jobs are then run on a process
+            pool (see dsim.runSizingJobs()) and their volumes stored in the caches, from which the assessment
+            reads them. Only the simulation method is sized in advance, the equation method is cheap."""
+            if self.sb_method != "Sim":
+                  return True
+
+            self.storagecache.setCollecting(True)
+            self.lottankmemo.setCollecting(True)
+            for i in self.blockDict.keys():
+                  currentAttList = self.blockDict[i]
+                  if currentAttList["Status"] == 0:
+                        continue
+                  #Only Blocks that the assessment does not skip size stores, see the assess...Opportunities() functions
+                  if len(techListLot) != 0 and self.hasLotOpportunities(currentAttList):
+                        self.determineStorageVolForLot(currentAttList, "RW", "RES")
+                        self.determineStorageVolForLot(currentAttList, "RW", "HDR")
+                  if len(techListNeigh) != 0 and self.hasNeighbourhoodOpportunities(currentAttList):
+                        self.determineStorageVolNeigh(currentAttList, "SW")
+                  if len(techListSubbas) != 0:
+                        upstreamIDs = self.retrieveStreamBlockIDs(currentAttList, "upstream")
+                        if self.hasSubbasinOpportunities(currentAttList, upstreamIDs):
+                              self.determineStorageVolSubbasin(currentAttList, "SW")
+            self.storagecache.setCollecting(False)
+            self.lottankmemo.setCollecting(False)
+
+            jobs = self.storagecache.getJobs() + self.lottankmemo.getJobs()
+            if len(jobs) == 0:
+                  return True
+            print "Sizing "+str(len(jobs))+" harvesting stores..."
+            results, stats = dsim.runSizingJobs(jobs, self.storagecache.getPatterns(), int(self.sizing_processes))
+            for jobtype, key, volume, seconds in results:
+                  if jobtype == "store":
+                        self.storagecache.setVolume(key, volume)
+                  elif jobtype == "lot":
+                        self.lottankmemo.setVolume(key, volume)
+            print "Storage sizing pre-pass statistics: "+str(stats)
+            return True
+
+      def hasLotOpportunities(self, currentAttList):
+            """Returns False if assessLotOpportunities() skips the Block because it has no lot units or no
+            lot space to build on, True otherwise. Also used by prepassStorageSizing()."""
+            hasUnits = int(currentAttList["HasHouses"]) * int(self.service_res) + \
+                       int(currentAttList["HasFlats"]) * int(self.service_hdr) + \
+                       int(currentAttList["Has_LI"]) * int(self.service_li) + \
+                       int(currentAttList["Has_HI"]) * int(self.service_hi) + \
+                       int(currentAttList["Has_Com"]) * int(self.service_com)
+            avail_sp = currentAttList["avLt_RES"] * int(self.service_res) + \
+                       currentAttList["av_HDRes"] * int(self.service_hdr) + \
+                       currentAttList["avLt_LI"] * int(self.service_li) + \
+                       currentAttList["avLt_HI"] * int(self.service_hi) + \
+                       currentAttList["avLt_COM"] * int(self.service_com)
+            if hasUnits == 0:   #SKIP CONDITION #1 - No Units to build on
+                  #print "No lot units to build on"
+                  return False
+            if avail_sp < 0.0001:    #SKIP CONDITION #2 - no space
+                  #print "No lot space to build on"
+                  return False
+            return True
+
       def assessLotOpportunities(self, techList, currentAttList):
             """Assesses if the shortlist of lot-scale technologies can be put into the lot scale
             Does this for one block at a time, depending on the currentAttributesList and the techlist
@@ -2092,12 +2288,7 @@ class UB_Techplan(Module):
             AimpCOM = currentAttList["COMAeEIA"]
 
             #Check SKIP CONDITIONS - return zero matrix if either is true.
-            if hasHouses + hasApts + hasLI + hasHI + hasCOM == 0:   #SKIP CONDITION #1 - No Units to build on
-                  #print "No lot units to build on"
-                  return tdRES, tdHDR, tdLI, tdHI, tdCOM
-
-            if lot_avail_sp + hdr_avail_sp + LI_avail_sp + HI_avail_sp + com_avail_sp < 0.0001:    #SKIP CONDITION #2 - no space
-                  #print "No lot space to build on"
+            if not self.hasLotOpportunities(currentAttList):
                   return tdRES, tdHDR, tdLI, tdHI, tdCOM
 
             #GET INFORMATION FROM VECTOR DATA
@@ -2112,8 +2303,8 @@ class UB_Techplan(Module):
             #Size the required store to achieve the required potable supply substitution.
             storeVols = []
             if bool(int(self.ration_harvest)):
-                  store_volRES = self.determineStorageVolForLot(currentAttList, self.raindata, self.evapscale, "RW", "RES")
-                  store_volHDR = self.determineStorageVolForLot(currentAttList, self.raindata, self.evapscale, "RW", "HDR")
+                  store_volRES = self.determineStorageVolForLot(currentAttList, "RW", "RES")
+                  store_volHDR = self.determineStorageVolForLot(currentAttList, "RW", "HDR")
                   storeVols = [store_volRES, store_volHDR]  #IF 100% service is to occur
                   #print storeVols
             else:
@@ -2123,8 +2314,8 @@ class UB_Techplan(Module):
                   tech_applications = self.getTechnologyApplications(j)
                   #print "Current Tech: "+str(j)+" applications: "+str(tech_applications)
 
-                  minsize = eval("self."+j+"minsize")         #gets the specific system's minimum allowable size
-                  maxsize = eval("self."+j+"maxsize")          #gets the specific system's maximum size
+                  minsize = getattr(self, j+"minsize")         #gets the specific system's minimum allowable size
+                  maxsize = getattr(self, j+"maxsize")          #gets the specific system's maximum size
 
                   #Design curve path
                   dcvpath = self.getDCVPath(j)            #design curve file as a string
@@ -2140,46 +2331,73 @@ class UB_Techplan(Module):
                   #HDR Systems
                   hasHDRsystems = int(currentAttList["HasL_HDRSys"])
                   if hasHDRsystems == 0 and hasApts != 0 and Aimphdr > 0.0001 and j not in ["banned","list","of","tech"]:    #Do apartment lot-scale system
-                        for i in self.lot_incr:
-                              if i == 0:
-                                    continue
-                              sys_objects = self.designTechnology(i, Aimphdr, j, dcvpath, tech_applications, soilK, minsize, maxsize, hdr_avail_sp, "HDR", currentID, np.inf)
+                        incrs = [i for i in self.lot_incr if i != 0]
+                        designs = self.designTechnologyArray(Aimphdr * np.array(incrs), j, dcvpath, tech_applications, soilK, minsize, maxsize)
+                        for index in range(len(incrs)):
+                              sys_objects = self.designTechnology(incrs[index], Aimphdr, j, dcvpath, tech_applications, soilK, minsize, maxsize, hdr_avail_sp, "HDR", currentID, np.inf, designs, index)
                               for sys_object in sys_objects:
                                     tdHDR.append(sys_object)
 
                   #LI Systems
                   hasLIsystems = int(currentAttList["HasL_LISys"])
                   if hasLIsystems == 0 and hasLI != 0 and AimpLI > 0.0001 and j not in ["banned","list","of","tech"]:
-                        for i in self.lot_incr:
-                              if i == 0:
-                                    continue
-                              sys_objects = self.designTechnology(i, AimpLI, j, dcvpath, tech_applications, soilK, minsize, maxsize, LI_avail_sp, "LI", currentID, np.inf)
+                        incrs = [i for i in self.lot_incr if i != 0]
+                        designs = self.designTechnologyArray(AimpLI * np.array(incrs), j, dcvpath, tech_applications, soilK, minsize, maxsize)
+                        for index in range(len(incrs)):
+                              sys_objects = self.designTechnology(incrs[index], AimpLI, j, dcvpath, tech_applications, soilK, minsize, maxsize, LI_avail_sp, "LI", currentID, np.inf, designs, index)
                               for sys_object in sys_objects:
                                     tdLI.append(sys_object)
 
                   #HI Systems
                   hasHIsystems = int(currentAttList["HasL_HISys"])
                   if hasHIsystems == 0 and hasHI != 0 and AimpHI > 0.0001 and j not in ["banned","list","of","tech"]:
-                        for i in self.lot_incr:
-                              if i == 0:
-                                    continue
-                              sys_objects = self.designTechnology(i, AimpHI, j, dcvpath, tech_applications, soilK, minsize, maxsize, HI_avail_sp, "HI", currentID, np.inf)
+                        incrs = [i for i in self.lot_incr if i != 0]
+                        designs = self.designTechnologyArray(AimpHI * np.array(incrs), j, dcvpath, tech_applications, soilK, minsize, maxsize)
+                        for index in range(len(incrs)):
+                              sys_objects = self.designTechnology(incrs[index], AimpHI, j, dcvpath, tech_applications, soilK, minsize, maxsize, HI_avail_sp, "HI", currentID, np.inf, designs, index)
                               for sys_object in sys_objects:
                                     tdHI.append(sys_object)
 
                   #COM Systems
                   hasCOMsystems = int(currentAttList["HasL_COMSys"])
                   if hasCOMsystems == 0 and hasCOM != 0 and AimpCOM > 0.0001 and j not in ["banned","list","of","tech"]:
-                        for i in self.lot_incr:
-                              if i == 0:
-                                    continue
-                              sys_objects = self.designTechnology(i, AimpCOM, j, dcvpath, tech_applications, soilK, minsize, maxsize, com_avail_sp, "COM", currentID, np.inf)
+                        incrs = [i for i in self.lot_incr if i != 0]
+                        designs = self.designTechnologyArray(AimpCOM * np.array(incrs), j, dcvpath, tech_applications, soilK, minsize, maxsize)
+                        for index in range(len(incrs)):
+                              sys_objects = self.designTechnology(incrs[index], AimpCOM, j, dcvpath, tech_applications, soilK, minsize, maxsize, com_avail_sp, "COM", currentID, np.inf, designs, index)
                               for sys_object in sys_objects:
                                     tdCOM.append(sys_object)
 
             return tdRES, tdHDR, tdLI, tdHI, tdCOM
 
-      def designTechnology(self, incr, Aimp, techabbr, dcvpath, tech_applications, soilK, minsize, maxsize, avail_sp, landuse, currentID, storeObj):
+      def designTechnologyArray(self, Adesign, techabbr, dcvpath, tech_applications, soilK, minsize, maxsize):
+            """Sizes a given system type for an array of impervious areas, e.g. one for each design increment, with
+            a single call to the technology's array design function per objective. Returns a dictionary of the
+            designs for runoff control "Qty", water quality control "WQ" and the lined treatment of a harvesting
+            system "RecWQ", each holding the arrays of required areas (np.nan if impossible) and area factors.
+            These are passed on to designTechnology() together with the index of the increment.
+            """
+            designs = {}
+            if techabbr not in td.DESIGN_FUNCTIONS:     #e.g. raintanks, designed by their store only
+                  return designs
+            designfunction = td.DESIGN_FUNCTIONS[techabbr]
+            Adesign = np.asarray(Adesign, dtype=float)
+
+            #Get Soil K to use for theoretical system design
+            if techabbr in ["BF", "SW", "IS", "WSUR", "PB"]:
+                  systemK = getattr(self, techabbr+"exfil")
+            else:
+                  systemK = 0
+
+            if tech_applications[0] == 1:
+                  designs["Qty"] = designfunction(Adesign, dcvpath, self.targetsvector, [tech_applications[0], 0, 0], soilK, systemK, minsize, maxsize)
+            if tech_applications[1] == 1:
+                  designs["WQ"] = designfunction(Adesign, dcvpath, self.targetsvector, [0, tech_applications[1], 0], soilK, systemK, minsize, maxsize)
+            if tech_applications[2] == 1:
+                  designs["RecWQ"] = designfunction(Adesign, dcvpath, self.targetsvector, [0, 1, 0], soilK, 0, minsize, maxsize)   #fully lined system
+            return designs
+
+      def designTechnology(self, incr, Aimp, techabbr, dcvpath, tech_applications, soilK, minsize, maxsize, avail_sp, landuse, currentID, storeObj, designs=None, index=0):
             """Carries out the design for a given system type on a given land use and scale. This function is
             used for the different land uses that can accommodate various technologies in the model.
             Input Arguments:
@@ -2189,6 +2407,8 @@ class UB_Techplan(Module):
             -dcvpath = design curve path                         -landuse = current land use being designed for
             -tech_applications = types of uses for technology    -currentID = currentBlockID
             -soilK = soil exfiltration rates                     -storeObj = object containing storage info in case of recycling objective
+            -designs, index = designs of all increments from designTechnologyArray() and the index of this increment,
+                              if None, the system is sized for this increment only
             Output Argument:
             - a WSUD object instance
             """
@@ -2208,18 +2428,15 @@ class UB_Techplan(Module):
                   design_Dem = 0
             #print "Design Demand :"+str(design_Dem)
 
-            #Get Soil K to use for theoretical system design
-            if techabbr in ["BF", "SW", "IS", "WSUR", "PB"]:
-                  systemK = eval("self."+str(techabbr)+"exfil")
-            else:
-                  systemK = 0
+            if designs == None:
+                  designs = self.designTechnologyArray([Adesign_imp], techabbr, dcvpath, tech_applications, soilK, minsize, maxsize)
+                  index = 0
 
             Asystem = {"Qty":[None, 1], "WQ":[None,1], "Rec":[None,1], "Size":[None, 1]}  #Template for system design, holds designs
 
             #OBJECTIVE 1 - Design for Runoff Control
             if tech_applications[0] == 1:
-                  purpose = [tech_applications[0], 0, 0]
-                  Asystem["Qty"] = eval('td.design_'+str(techabbr)+'('+str(Adesign_imp)+',"'+str(dcvpath)+'",'+str(self.targetsvector)+','+str(purpose)+','+str(soilK)+','+str(systemK)+','+str(minsize)+','+str(maxsize)+')')
+                  Asystem["Qty"] = td.getDesignFromArray(designs["Qty"], index)
                   #print Asystem["Qty"]
             else:
                   Asystem["Qty"] = [None, 1]
@@ -2228,8 +2445,7 @@ class UB_Techplan(Module):
 
             #OBJECTIVE 2 - Design for WQ Control
             if tech_applications[1] == 1:
-                  purpose = [0, tech_applications[1], 0]
-                  Asystem["WQ"] = eval('td.design_'+str(techabbr)+'('+str(Adesign_imp)+',"'+str(dcvpath)+'",'+str(self.targetsvector)+','+str(purpose)+','+str(soilK)+','+str(systemK)+','+str(minsize)+','+str(maxsize)+')')
+                  Asystem["WQ"] = td.getDesignFromArray(designs["WQ"], index)
                   #print Asystem["WQ"]
             else:
                   Asystem["WQ"] = [None, 1]
@@ -2261,11 +2477,10 @@ class UB_Techplan(Module):
             addstore = []   #Has several arguments [store object, WQsize, QTYsize, type of store, integrated?]
             if tech_applications[2] == 1 and storeObj != np.inf:
                   #First design for WQ control (assume raintanks don't use natural treatment)
-                  purpose = [0, 1, 0]
                   if techabbr in ["RT", "GW"]:        #If a raintank or greywater system, then no area required. Assume treatment is through some
                         AsystemRecWQ = [0, 1]           #   non-green-infrastructure means
                   else:   #Design for a fully lined system!
-                        AsystemRecWQ = eval('td.design_'+str(techabbr)+'('+str(Adesign_imp)+',"'+str(dcvpath)+'",'+str(self.targetsvector)+','+str(purpose)+','+str(soilK)+','+str(0)+','+str(minsize)+','+str(maxsize)+')')
+                        AsystemRecWQ = td.getDesignFromArray(designs["RecWQ"], index)
                         #Required surface are of a system that only does water quality management...
 
                   vol = storeObj.getSize()
@@ -2285,7 +2500,7 @@ class UB_Techplan(Module):
                   #   GW = standard storage volume
                   if techabbr in ["RT", "GW", "PB", "WSUR"] and design_harvest:        #Turn the WQ system into a SWH system based on hybrid combos
                         sysdepth = float(self.sysdepths[techabbr])     #obtain the system depth
-                        AsystemRecQty = eval('td.sizeStoreArea_'+str(techabbr)+'('+str(vol)+','+str(sysdepth)+','+str(0)+','+str(9999)+')')
+                        AsystemRecQty = td.STORE_AREA_FUNCTIONS[techabbr](vol, sysdepth, 0, 9999)
                         #print "AsysrecQty[RT, GW, PB. WSUR]", AsystemRecQty
                         if AsystemRecQty[0] != None:
                               addstore.append([storeObj, AsystemRecWQ, AsystemRecQty, techabbr, 1])     #Input arguments to addstore function
@@ -2391,12 +2606,13 @@ class UB_Techplan(Module):
                   tech_applications = self.getTechnologyApplications(j)
                   #print "Assessing street techs for "+str(j)+" applications: "+str(tech_applications)
 
-                  minsize = eval("self."+j+"minsize")
-                  maxsize = eval("self."+j+"maxsize")          #gets the specific system's maximum size
+                  minsize = getattr(self, j+"minsize")
+                  maxsize = getattr(self, j+"maxsize")          #gets the specific system's maximum size
 
                   #Design curve path
                   dcvpath = self.getDCVPath(j)
 
+                  increments = []     #[lot_deg, street_deg, Aimp to treat] of all combinations to design for
                   for lot_deg in self.lot_incr:
                         AimpremainRes = AimpstRes + (AimpRes *(1-lot_deg))      #street + remaining lot
                         AimpremainHdr = Aimphdr*(1.0-lot_deg)
@@ -2410,15 +2626,43 @@ class UB_Techplan(Module):
                               #print "Aimp to treat: "+str(AimptotreatRes)
 
                               if hasHouses != 0 and AimptotreatRes > 0.0001:
-                                    sys_objects = self.designTechnology(street_deg, AimptotreatRes, j, dcvpath,
-                                          tech_applications, soilK, minsize, maxsize,
-                                          street_avail_Res, "Street", currentID, storeObj)
-                                    for sys_object in sys_objects:
-                                          sys_object.setDesignIncrement([lot_deg, street_deg])
-                                          technologydesigns.append(sys_object)
+                                    increments.append([lot_deg, street_deg, AimptotreatRes])
+
+                  #Size all combinations at once, then create the technology objects
+                  Adesign = [incr[2] * incr[1] for incr in increments]
+                  designs = self.designTechnologyArray(Adesign, j, dcvpath, tech_applications, soilK, minsize, maxsize)
+                  for index in range(len(increments)):
+                        lot_deg, street_deg, AimptotreatRes = increments[index]
+                        sys_objects = self.designTechnology(street_deg, AimptotreatRes, j, dcvpath,
+                              tech_applications, soilK, minsize, maxsize,
+                              street_avail_Res, "Street", currentID, storeObj, designs, index)
+                        for sys_object in sys_objects:
+                              sys_object.setDesignIncrement([lot_deg, street_deg])
+                              technologydesigns.append(sys_object)
             return technologydesigns
 
 
+      def getBlockAvailableSpace(self, currentAttList):
+            """Returns the space available to neighbourhood and sub-basin systems in the Block [sqm]"""
+            av_PG = currentAttList["PG_av"]
+            av_REF = currentAttList["REF_av"]
+            av_SVU_sw = currentAttList["SVU_avSW"]
+            av_SVU_ws = currentAttList["SVU_avWS"]
+            return av_PG + av_REF + av_SVU_sw + av_SVU_ws
+
+      def hasNeighbourhoodOpportunities(self, currentAttList):
+            """Returns False if assessNeighbourhoodOpportunities() skips the Block because it already has
+            systems, no impervious area to treat or no space, True otherwise. Also used by
+            prepassStorageSizing()."""
+            AblockEIA = currentAttList["Manage_EIA"]
+            hasNsystems = int(currentAttList["HasNSys"])
+            hasBsystems = int(currentAttList["HasBSys"])
+            if AblockEIA <= 0.0001 or hasNsystems == 1 or hasBsystems == 1:
+                  return False    #SKIP CONDITION 1 - already systems in place or no impervious area to treat
+            if self.getBlockAvailableSpace(currentAttList) < 0.0001:
+                  return False    #SKIP CONDITION 2 - NO SPACE AVAILABLE
+            return True
+
       def assessNeighbourhoodOpportunities(self, techList, currentAttList):
             """Assesses if the shortlist of neighbourhood-scale technologies can be put in local parks
             & other areas. Does this for one block at a time, depending on the currentAttributesList
@@ -2427,41 +2671,37 @@ class UB_Techplan(Module):
             currentID = int(currentAttList["BlockID"])
             technologydesigns = [0]
 
+            if not self.hasNeighbourhoodOpportunities(currentAttList):
+                  return technologydesigns
+
             #Grab total impervious area and available space
             AblockEIA = currentAttList["Manage_EIA"]
-            hasNsystems = int(currentAttList["HasNSys"])
-            hasBsystems = int(currentAttList["HasBSys"])
-            if AblockEIA <= 0.0001 or hasNsystems == 1 or hasBsystems == 1:
-                  return technologydesigns    #SKIP CONDITION 1 - already systems in place or no impervious area to treat
-
-            av_PG = currentAttList["PG_av"]
-            av_REF = currentAttList["REF_av"]
-            av_SVU_sw = currentAttList["SVU_avSW"]
-            av_SVU_ws = currentAttList["SVU_avWS"]
-            totalavailable = av_PG + av_REF + av_SVU_sw + av_SVU_ws
-            if totalavailable < 0.0001:
-                  return technologydesigns    #SKIP CONDITION 2 - NO SPACE AVAILABLE
+            totalavailable = self.getBlockAvailableSpace(currentAttList)
 
             #GET INFORMATION FROM VECTOR DATA
             soilK = currentAttList["Soil_k"]
 
             #Size a combination of stormwater harvesting stores
             if bool(int(self.ration_harvest)):
-                  neighSWstores = self.determineStorageVolNeigh(currentAttList, self.raindata, self.evapscale, "SW")
+                  neighSWstores = self.determineStorageVolNeigh(currentAttList, "SW")
                   #print neighSWstores
 
             for j in techList:
                   tech_applications = self.getTechnologyApplications(j)
                   #print "Currently designing tech: "+str(j)+" available applications: "+str(tech_applications)
 
-                  minsize = eval("self."+j+"minsize")
-                  maxsize = eval("self."+j+"maxsize")         #Gets the specific system's maximum size
+                  minsize = getattr(self, j+"minsize")
+                  maxsize = getattr(self, j+"maxsize")         #Gets the specific system's maximum size
                   #Design curve path
                   dcvpath = self.getDCVPath(j)
-                  for neigh_deg in self.neigh_incr:
+
+                  #Size all increments at once, then create the technology objects
+                  increments = [neigh_deg for neigh_deg in self.neigh_incr if neigh_deg != 0]
+                  Adesign = [neigh_deg * AblockEIA * neigh_deg for neigh_deg in increments]
+                  designs = self.designTechnologyArray(Adesign, j, dcvpath, tech_applications, soilK, minsize, maxsize)
+                  for index in range(len(increments)):
+                        neigh_deg = increments[index]
                         #print "Current Neigh Deg: "+str(neigh_deg)
-                        if neigh_deg == 0:
-                              continue
 
                         Aimptotreat = neigh_deg * AblockEIA
 
@@ -2472,14 +2712,14 @@ class UB_Techplan(Module):
                                           continue
                                     storeObj = curStoreObjs[supplyincr]
                                     sys_objects = self.designTechnology(neigh_deg, Aimptotreat, j, dcvpath, tech_applications,
-                                                      soilK, minsize, maxsize, totalavailable, "Neigh", currentID, storeObj)
+                                                      soilK, minsize, maxsize, totalavailable, "Neigh", currentID, storeObj, designs, index)
                                     for sys_object in sys_objects:
                                           sys_object.setDesignIncrement(neigh_deg)
                                           technologydesigns.append(sys_object)
                         else:
                               storeObj = np.inf
                               sys_objects = self.designTechnology(neigh_deg, Aimptotreat, j, dcvpath, tech_applications,
-                                                                  soilK, minsize, maxsize, totalavailable, "Neigh", currentID, storeObj)
+                                                                  soilK, minsize, maxsize, totalavailable, "Neigh", currentID, storeObj, designs, index)
                               for sys_object in sys_objects:
                                     sys_object.setDesignIncrement(neigh_deg)
                                     technologydesigns.append(sys_object)
@@ -2487,64 +2727,75 @@ class UB_Techplan(Module):
             return technologydesigns
 
 
-      def assessSubbasinOpportunities(self, techList, currentAttList):
-            """Assesses if the shortlist of sub-basin-scale technologies can be put in local parks
-            & other areas. Does this for one block at a time, depending on the currentAttributesList
-            and the techlist
+      def hasSubbasinOpportunities(self, currentAttList, upstreamIDs):
+            """Returns False if assessSubbasinOpportunities() skips the Block, True otherwise. Also used by
+            prepassStorageSizing().
+                  - upstreamIDs: the Block's upstream Block IDs, see retrieveStreamBlockIDs()
             """
-            currentID = int(currentAttList["BlockID"])
-
-            technologydesigns = {}  #Three Conditions: 1) there must be upstream blocks
-                                                     # 2) there must be space available,
-                                                     # 3) there must be impervious to treat
-
-            soilK = currentAttList["Soil_k"]
-
             #SKIP CONDITION 1: Grab Block's Upstream Area
-            upstreamIDs = self.retrieveStreamBlockIDs(currentAttList, "upstream")
             hasBsystems = int(currentAttList["HasBSys"])
             hasNsystems = int(currentAttList["HasBSys"])
             if len(upstreamIDs) == 0 or hasBsystems == 1 or hasNsystems == 1:
                   #print "Current Block has no upstream areas, skipping"
-                  return technologydesigns
+                  return False
 
             #SKIP CONDITION 2: Grab Total available space, if there is none, no point continuing
-            av_PG = currentAttList["PG_av"]
-            av_REF = currentAttList["REF_av"]
-            av_SVU_sw = currentAttList["SVU_avSW"]
-            av_SVU_ws = currentAttList["SVU_avWS"]
-            totalavailable = av_PG + av_REF + av_SVU_sw + av_SVU_ws
+            totalavailable = self.getBlockAvailableSpace(currentAttList)
             if totalavailable < 0.0001:
                   #print "Total Available Space in Block to do STUFF: "+str(totalavailable)+" less than threshold"
-                  return technologydesigns
+                  return False
 
             #SKIP CONDITION 3: Get Block's upstream Impervious area
             upstreamImp = self.retrieveAttributeFromIDs(upstreamIDs, "Manage_EIA", "sum")
             if upstreamImp < 0.0001:
                   #print "Total Upstream Impervious Area: "+str(upstreamImp)+" less than threshold"
+                  return False
+            return True
+
+      def assessSubbasinOpportunities(self, techList, currentAttList):
+            """Assesses if the shortlist of sub-basin-scale technologies can be put in local parks
+            & other areas. Does this for one block at a time, depending on the currentAttributesList
+            and the techlist
+            """
+            currentID = int(currentAttList["BlockID"])
+
+            technologydesigns = {}  #Three Conditions: 1) there must be upstream blocks
+                                                     # 2) there must be space available,
+                                                     # 3) there must be impervious to treat
+
+            soilK = currentAttList["Soil_k"]
+
+            upstreamIDs = self.retrieveStreamBlockIDs(currentAttList, "upstream")
+            if not self.hasSubbasinOpportunities(currentAttList, upstreamIDs):
                   return technologydesigns
+            totalavailable = self.getBlockAvailableSpace(currentAttList)
+            upstreamImp = self.retrieveAttributeFromIDs(upstreamIDs, "Manage_EIA", "sum")
 
             #Initialize techdesignvector's dictionary keys
             for j in self.subbas_incr:
                   technologydesigns[j] = [0]
 
             if bool(int(self.ration_harvest)):
-                  subbasSWstores = self.determineStorageVolSubbasin(currentAttList, self.raindata, self.evapscale, "SW")
+                  subbasSWstores = self.determineStorageVolSubbasin(currentAttList, "SW")
                   #print "Subbasin: "+str(subbasSWstores)
 
             for j in techList:
                   tech_applications = self.getTechnologyApplications(j)
                   #print "Now designing for "+str(j)+" for applications: "+str(tech_applications)
 
-                  minsize = eval("self."+j+"minsize")
-                  maxsize = eval("self."+j+"maxsize")     #Gets the specific system's maximum allowable size
+                  minsize = getattr(self, j+"minsize")
+                  maxsize = getattr(self, j+"maxsize")     #Gets the specific system's maximum allowable size
 
                   #Design curve path
                   dcvpath = self.getDCVPath(j)
-                  for bas_deg in self.subbas_incr:
+
+                  #Size all increments at once, then create the technology objects
+                  increments = [bas_deg for bas_deg in self.subbas_incr if bas_deg != 0]
+                  Adesign = [upstreamImp * bas_deg * bas_deg for bas_deg in increments]
+                  designs = self.designTechnologyArray(Adesign, j, dcvpath, tech_applications, soilK, minsize, maxsize)
+                  for index in range(len(increments)):
+                        bas_deg = increments[index]
                         #print "Current Basin Deg: "+str(bas_deg)
-                        if bas_deg == 0:
-                              continue
                         Aimptotreat = upstreamImp * bas_deg
                         #print "Aimp to treat: "+str(Aimptotreat)
 
@@ -2556,7 +2807,7 @@ class UB_Techplan(Module):
                                           continue
                                     storeObj = curStoreObjs[supplyincr]
                                     sys_objects = self.designTechnology(bas_deg, Aimptotreat, j, dcvpath, tech_applications,
-                                                      soilK, minsize, maxsize, totalavailable, "Subbas", currentID, storeObj)
+                                                      soilK, minsize, maxsize, totalavailable, "Subbas", currentID, storeObj, designs, index)
                                     
                                     for sys_object in sys_objects:
                                           sys_object.setDesignIncrement(bas_deg)
@@ -2564,7 +2815,7 @@ class UB_Techplan(Module):
                         else:
                               storeObj = np.inf
                               sys_objects = self.designTechnology(bas_deg, Aimptotreat, j, dcvpath, tech_applications,
-                                                soilK, minsize, maxsize, totalavailable, "Subbas", currentID, storeObj)
+                                                soilK, minsize, maxsize, totalavailable, "Subbas", currentID, storeObj, designs, index)
                               for sys_object in sys_objects:
                                     sys_object.setDesignIncrement(bas_deg)
                                     technologydesigns[bas_deg].append(sys_object)
@@ -2655,13 +2906,11 @@ class UB_Techplan(Module):
                   output = sum(datavector)
             return output
 
-      def determineStorageVolForLot(self, currentAttList, rain, evapscale, wqtype, lottype):
+      def determineStorageVolForLot(self, currentAttList, wqtype, lottype):
             """Uses information of the Block's lot-scale to determine what the required
             storage size of a water recycling system is to meet the required end uses
             and achieve the user-defined potable water reduction
             - currentAttList:  current Attribute list of the block in question
-            - rain: rainfall data for determining inflows if planning SW harvesting
-            - evapscale: scaling factors for outdoor irrigation demand scaling
             - wqtype: the water quality being harvested (determines the type of end
             uses acceptable)
 
@@ -2730,21 +2979,12 @@ class UB_Techplan(Module):
             elif lottype == "HDR":
                   Aroof = currentAttList["HDRRoofA"]
 
-            #Determine demand time series
-            if "Irrigation" in enduses.keys():
-                  #Scale to evap pattern
-                  demandseries = ubseries.createScaledDataSeries(recdemand, evapscale, False)
-            else:
-                  #Scale to constant pattern
-                  demandseries = ubseries.createConstantDataSeries(recdemand/365, len(rain))
-
-            #Generate the inflow series based on the kind of water being harvested
+            #Average annual inflow and tank sizes based on the kind of water being harvested
+            rain, evapscale = self.getClimateData()
             if wqtype in ["RW", "SW"]:      #Use rainwater to generate inflow
-                  inflow = ubseries.convertDataToInflowSeries(rain, Aroof, False)     #Convert rainfall to inflow
                   maxinflow = sum(rain)/1000 * Aroof / self.rain_length         #average annual inflow using whole roof
                   tank_templates = self.lot_raintanksizes     #Use the possible raintank sizes
             elif wqtype in ["GW"]:  #Use greywater to generate inflow
-                  inflow = 0
                   maxinflow = 0
                   tank_templates = [] #use the possible greywater tank sizes
 
@@ -2752,33 +2992,57 @@ class UB_Techplan(Module):
                   #If Vdem not within the bounds of total inflow
                   return np.inf       #cannot size a store that is supplying more than it is getting or not economical to size
 
+            #Blocks with the same (quantised) roof area, demand and end uses share the tank size
+            memokey, Aroof_q, recdemand_q = self.lottankmemo.getKey(Aroof, recdemand, objenduses, self.climateid,
+                                                                    self.targets_reliability, wqtype, self.sb_method,
+                                                                    tuple(tank_templates))
+            storageVol = self.lottankmemo.getVolume(memokey)
+            if storageVol is None and self.lottankmemo.isCollecting():
+                  #Pre-pass, only record the sizing job, see prepassStorageSizing()
+                  jobargs = self.getLotTankJob(rain, evapscale, wqtype, enduses, Aroof_q, recdemand_q, tank_templates)
+                  if jobargs is not None:
+                        self.lottankmemo.addJob(memokey, jobargs)
+                  return np.inf
+            if storageVol is None:
+                  storageVol = self.sizeLotTank(rain, evapscale, wqtype, enduses, Aroof_q, recdemand_q, tank_templates)
+                  self.lottankmemo.setVolume(memokey, storageVol)
+
+            storeObj = tt.RecycledStorage(wqtype, storageVol,  objenduses, Aroof, self.targets_reliability, recdemand, "L")
+            #End of function: returns storageVol as either [1kL, 2kL, 5kL, 10kL, 15kL, 20kL] or np.inf
+            return storeObj
+
+      def getLotTankJob(self, rain, evapscale, wqtype, enduses, Aroof, recdemand, tank_templates):
+            """Returns the arguments of a "lot" sizing job (see dsim.runSizingJob()) for sizing a lot tank by
+            simulation, or None if the water source cannot be simulated or there are no tanks to pick from."""
+            if wqtype not in ["RW", "SW"] or len(tank_templates) == 0:
+                  return None
+            irrigation = "Irrigation" in enduses.keys()
+            patternid = self.getUnitPatternID(rain, evapscale, wqtype, irrigation)
+            return [patternid, Aroof, recdemand, list(tank_templates), self.targets_reliability]
+
+      def sizeLotTank(self, rain, evapscale, wqtype, enduses, Aroof, recdemand, tank_templates):
+            """Picks the smallest tank of 'tank_templates' that supplies the annual demand 'recdemand' [kL/yr]
+            from a roof 'Aroof' [sqm] at the target reliability, returns np.inf if none does. Used by
+            determineStorageVolForLot() on a lot tank memo miss."""
+            storageVol = np.inf      #Assume infinite storage for now
             #Depending on Method, size the store
             if self.sb_method == "Sim":
-                  mintank_found = 0
-                  storageVol = np.inf      #Assume infinite storage for now
-                  for i in tank_templates:        #Run through loop
-                        if mintank_found == 1:
-                              continue
-                  rel = dsim.calculateTankReliability(inflow, demandseries, i)
-                  if rel > self.targets_reliability:
-                        mintank_found = 1
-                        storageVol = i
+                  jobargs = self.getLotTankJob(rain, evapscale, wqtype, enduses, Aroof, recdemand, tank_templates)
+                  if jobargs is None:
+                        return storageVol
+                  unitinflow, unitdemand = self.storagecache.getPatterns()[jobargs[0]]
+                  storageVol = dsim.sizeTankFromTemplates(unitinflow, unitdemand, *jobargs[1:])
 
             elif self.sb_method == "Eqn":
-                  vdemvsupp = recdemand / maxinflow
-                  storagePerc = deq.loglogSWHEquation(self.regioncity, self.targets_reliability, inflow, demandseries)
-                  reqVol = storagePerc/100*maxinflow  #storagePerc is the percentage of the avg. annual inflow
+                  reqVol = self.sizeStoresByEquation(rain, evapscale, wqtype, "Irrigation" in enduses.keys(), [Aroof], [recdemand])[0]
 
                   #Determine where this volume ranks in reliability
-                  storageVol = np.inf     #Assume infinite storage for now, readjust later
                   tank_templates.reverse()        #Reverse the series for the loop
                   for i in range(len(tank_templates)):
                         if reqVol < tank_templates[i]: #Begins with largest tank
                               storageVol = tank_templates[i] #Begins with largest tank    #if the volume is below the current tank size, use the 'next largest'
                   tank_templates.reverse()        #Reverse the series back in case it needs to be used again
-            storeObj = tt.RecycledStorage(wqtype, storageVol,  objenduses, Aroof, self.targets_reliability, recdemand, "L")
-            #End of function: returns storageVol as either [1kL, 2kL, 5kL, 10kL, 15kL, 20kL] or np.inf
-            return storeObj
+            return storageVol
 
       def determineEndUses(self, wqtype):
             """Returns an array of the allowable water end uses for the given water
@@ -2795,13 +3059,11 @@ class UB_Techplan(Module):
             if self.ffplevels[self.public_irr_wq] >= wqlevel: enduses.append("PI")
             return enduses
 
-      def determineStorageVolNeigh(self, currentAttList, rain, evapscale, wqtype):
+      def determineStorageVolNeigh(self, currentAttList, wqtype):
             """Uses information of the Block to determine the required storage size of
             a water recycling system to meet required end uses and achieve the user-defined
             potable water reduction and reliability targets
             - currentAttList:  current Attribute list of the block in question
-            - rain: rainfall data for determining inflows if planning SW harvesting
-            - evapscale: scaling factors for outdoor irrigation demand scaling
             - wqtype: water quality being harvested (determines the type of end
             uses acceptable)
 
@@ -2829,6 +3091,10 @@ class UB_Techplan(Module):
             if totalsubdemand == 0: #If nothing can be substituted, return infinity
                   return np.inf
 
+            rain, evapscale = self.getClimateData()
+            rainsum = sum(rain)
+            eqnstores = []      #[harvest incr, supply incr, Aharvest, demand] of stores sized by the equation method
+
             #Loop across increments: Storage that harvests all area/WW to supply [0.25, 0.5, 0.75, 1.0] of demand
             for i in range(len(self.neigh_incr)):   #Loop across harvestable area
                   if self.neigh_incr[i] == 0:
@@ -2857,20 +3123,12 @@ class UB_Techplan(Module):
                         Aharvest = currentAttList["Blk_EIA"]*harvestincr   #Start with this
                         #print "Harvestable Area :"+str(Aharvest)
 
-                        if "I" in enduses:      #If irrigation is part of end uses
-                              #Scale to evap pattern
-                              demandseries = ubseries.createScaledDataSeries(recdemand, evapscale, False)
-                        else:
-                              #Scale to constant pattern
-                              demandseries = ubseries.createScaledDataSeries(recdemand/365, len(rain))
-
-                        #Generate the inflow series based on kind of water being harvested
+                        #Average annual inflow based on kind of water being harvested, the inflow and demand
+                        #series are scaled from the unit patterns when sizing the store
                         if wqtype in ["RW", "SW"]:
-                              inflow = ubseries.convertDataToInflowSeries(rain, Aharvest, False)
-                              maxinflow = sum(rain)/1000*Aharvest / self.rain_length
+                              maxinflow = rainsum/1000*Aharvest / self.rain_length
                               #print "Average annual inflow: "+str(maxinflow)
                         elif wqtype in ["GW"]:
-                              inflow = 0
                               maxinflow = 0
 
                         if (self.rec_demrange_max/100.0)*maxinflow < recdemand or (self.rec_demrange_min/100.0)*maxinflow > recdemand:
@@ -2880,17 +3138,77 @@ class UB_Techplan(Module):
 
                         #Size the store depending on method
                         if self.sb_method == "Sim":
-                              reqVol = dsim.estimateStoreVolume(inflow, demandseries, self.targets_reliability, self.relTolerance, self.maxSBiterations)
+                              reqVol = self.getStorageVolume(rain, evapscale, wqtype, "I" in enduses, recdemand, Aharvest)
                               #print "reqVol: "+str(reqVol)
                         elif self.sb_method == "Eqn":
-                              vdemvsupp = recdemand / maxinflow
-                              storagePerc = deq.loglogSWHEquation(self.regioncity, self.targets_reliability, inflow, demandseries)
-                              reqVol = storagePerc/100*maxinflow  #storagePerc is the percentage of the avg. annual inflow
+                              eqnstores.append([harvestincr, supplyincr, Aharvest, recdemand])      #sized together below
+                              continue
                         storeObj = tt.RecycledStorage(wqtype, reqVol, enduses, Aharvest, self.targets_reliability, recdemand, "N")
                         storageVol[harvestincr][supplyincr] = storeObj       #at each lot incr: [ x options ]
+
+            #Size all stores of the equation method at once
+            if len(eqnstores) != 0:
+                  reqVols = self.sizeStoresByEquation(rain, evapscale, wqtype, "I" in enduses,
+                                                      [store[2] for store in eqnstores], [store[3] for store in eqnstores])
+                  for k in range(len(eqnstores)):
+                        harvestincr, supplyincr, Aharvest, recdemand = eqnstores[k]
+                        storeObj = tt.RecycledStorage(wqtype, float(reqVols[k]), enduses, Aharvest, self.targets_reliability, recdemand, "N")
+                        storageVol[harvestincr][supplyincr] = storeObj
             #print storageVol[harvestincr]
             return storageVol
 
+      def getUnitPatternID(self, rain, evapscale, wqtype, irrigation):
+            """Returns the ID of the unit inflow [kL per sqm harvested] and unit demand [kL per kL/yr demanded]
+            patterns of the water source and demand type. Stormwater and rainwater inflows scale with the
+            harvested area and demands with the annual demand, so every store of a pattern is a scaled copy.
+            The patterns are built on first use as ScaledSeries views (see ubseries.ScaledSeries), which every
+            store rescales without copying the series, and registered with the storage sizing cache and, as
+            moments, for the equation method.
+            - rain, evapscale: climate data
+            - wqtype: water quality harvested, "RW" or "SW"
+            - irrigation: True if the demand follows the evap pattern, otherwise it is constant
+            """
+            if irrigation:
+                  patternid = wqtype+"_I"     #evap-scaled demand
+            else:
+                  patternid = wqtype+"_C"     #constant demand
+            if not self.storagecache.hasPattern(patternid):
+                  unitinflow = ubseries.createInflowView(rain, 1.0)
+                  if irrigation:
+                        unitdemand = ubseries.createScaledView(1.0, evapscale)
+                  else:
+                        unitdemand = ubseries.createConstantView(1.0/365, len(rain))
+                  self.storagecache.setPattern(patternid, unitinflow, unitdemand)
+                  self.eqnmoments[patternid] = deq.SWHSeriesMoments(unitinflow, unitdemand)
+            return patternid
+
+      def getStorageVolume(self, rain, evapscale, wqtype, irrigation, recdemand, Aharvest):
+            """Sizes a harvesting store by simulation through the scale-normalised storage sizing cache, so that
+            stores of the same demand-to-area ratio are only simulated once for all Blocks and increments.
+            - rain, evapscale: climate data
+            - wqtype, irrigation: water quality harvested and whether the demand follows the evap pattern
+            - recdemand: annual demand supplied [kL/yr]
+            - Aharvest: harvested area [sqm]
+            """
+            if wqtype not in ["RW", "SW"]:
+                  return np.inf       #Only rainwater and stormwater inflows are modelled
+            patternid = self.getUnitPatternID(rain, evapscale, wqtype, irrigation)
+            return self.storagecache.estimateStoreVolume(patternid, recdemand/Aharvest, Aharvest, self.targets_reliability,
+                                                         self.relTolerance, self.maxSBiterations)
+
+      def sizeStoresByEquation(self, rain, evapscale, wqtype, irrigation, catchments, demands):
+            """Sizes harvesting stores with the log-log SWH equation for lists of harvested areas [sqm] and annual
+            demands [kL/yr] in one go. The equation inputs are derived from the moments of the unit patterns (see
+            getUnitPatternID()) instead of building and scanning the series of every store. Returns an array of
+            store volumes [kL]."""
+            if wqtype not in ["RW", "SW"]:
+                  return np.inf * np.ones(len(catchments))
+            patternid = self.getUnitPatternID(rain, evapscale, wqtype, irrigation)
+            storagePerc = deq.loglogSWHEquationBatch(self.regioncity, self.targets_reliability, self.eqnmoments[patternid],
+                                                     catchments, demands)
+            maxinflow = sum(rain)/1000 * np.asarray(catchments, dtype=float) / self.rain_length
+            return storagePerc/100*maxinflow    #storagePerc is the percentage of the avg. annual inflow
+
       def getTotalWaterDemandEndUse(self, currentAttList, enduse):
             """Retrieves all end uses for the current Block based on the end use matrix
             and the lot-increment.
@@ -2911,7 +3229,7 @@ class UB_Techplan(Module):
             return demand
 
 
-      def determineStorageVolSubbasin(self, currentAttList, rain, evapscale, wqtype):
+      def determineStorageVolSubbasin(self, currentAttList, wqtype):
             """Uses information of the current Block and the broader sub-basin to determine
             the required storage size of a water recycling system to meet required end uses
             and achieve user-defined potable water reduction and reliability targets. It does
@@ -2923,8 +3241,6 @@ class UB_Techplan(Module):
 
             Input parameters:
             - currentAttList: current Attribute list of the block in question
-            - rain: rainfall data for determining inflows if planning SW harvesting
-            - evapscale: scaling factors for outdoor irrigation demand scaling
             - wqtype: water quality being harvested (determines the type of end uses
             accepable)
 
@@ -2975,6 +3291,9 @@ class UB_Techplan(Module):
                   #Future - add something to deal with retrofit
 
             storageVol = {}
+            rain, evapscale = self.getClimateData()
+            rainsum = sum(rain)
+            eqnstores = []      #[harvest incr, supply incr, Aharvest, demand] of stores sized by the equation method
             #(4) Generate Demand Time Series
             for i in range(len(self.subbas_incr)):          #HARVEST x% LOOP
                   if self.subbas_incr[i] == 0:
@@ -2995,17 +3314,10 @@ class UB_Techplan(Module):
 
                         Aharvest = AharvestTot * harvestincr
                         #print "Required demand: "+str(recdemand)
-                        if "I" in enduses:
-                              demandseries = ubseries.createScaledDataSeries(recdemand, evapscale, False)
-                        else:
-                              demandseries = ubseries.createScaledDataSeries(recdemand/365, len(rain))
-
                         if wqtype in ["RW", "SW"]:
-                              inflow = ubseries.convertDataToInflowSeries(rain, Aharvest, False)
-                              maxinflow = sum(rain)/1000*Aharvest / self.rain_length
+                              maxinflow = rainsum/1000*Aharvest / self.rain_length
                               #print "Average annual inflow: "+str(maxinflow)
                         elif wqtype in ["GW"]:
-                              inflow = 0
                               maxinflow = 0
 
                         if (self.rec_demrange_max/100.0)*maxinflow < recdemand or (self.rec_demrange_min/100.0)*maxinflow > recdemand:
@@ -3015,15 +3327,23 @@ class UB_Techplan(Module):
 
                         #(5) Size the store for the current combo
                         if self.sb_method == "Sim":
-                              reqVol = dsim.estimateStoreVolume(inflow, demandseries, self.targets_reliability, self.relTolerance, self.maxSBiterations)
+                              reqVol = self.getStorageVolume(rain, evapscale, wqtype, "I" in enduses, recdemand, Aharvest)
                               #print "reqVol: "+str(reqVol)
                         elif self.sb_method == "Eqn":
-                              vdemvsupp = recdemand / maxinflow
-                              storagePerc = deq.loglogSWHEquation(self.regioncity, self.targets_reliability, inflow, demandseries)
-                              reqVol = storagePerc/100*maxinflow  #storagePerc is the percentage of the avg. annual inflow
+                              eqnstores.append([harvestincr, supplyincr, Aharvest, recdemand])      #sized together in (6)
+                              continue
 
                         storeObj = tt.RecycledStorage(wqtype, reqVol, enduses, Aharvest, self.targets_reliability, recdemand, "B")
                         storageVol[harvestincr][supplyincr] = storeObj
+
+            #(6) Size all stores of the equation method at once
+            if len(eqnstores) != 0:
+                  reqVols = self.sizeStoresByEquation(rain, evapscale, wqtype, "I" in enduses,
+                                                      [store[2] for store in eqnstores], [store[3] for store in eqnstores])
+                  for k in range(len(eqnstores)):
+                        harvestincr, supplyincr, Aharvest, recdemand = eqnstores[k]
+                        storeObj = tt.RecycledStorage(wqtype, float(reqVols[k]), enduses, Aharvest, self.targets_reliability, recdemand, "B")
+                        storageVol[harvestincr][supplyincr] = storeObj
             return storageVol
 
       ###################################
@@ -22,6 +22,8 @@ You should have received a copy of the GNU General Public License
 along with this program; if not, write to the Free Software
 Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """
+import datetime, hashlib, json, os
+import numpy as np
 
 def loadClimateFile(filename, filetype, dt_in, dt_out, numyears):
     """Retrieves climate file based on the input filename and format specified. Format
@@ -34,72 +36,440 @@ def loadClimateFile(filename, filetype, dt_in, dt_out, numyears):
 
     Current support rainfile formats are: .csv, .ixx, .mse
     """
+    #Narrow down the data to only what the user wants
+    return readClimateSeries(filename, filetype, dt_in, dt_out).getSubSet(numyears).toList()
+
+CLIMATE_FILE_TYPES = ["csv", "ixx", "mse"]     #Formats readClimateSeries() can read
+
+def getClimateFileType(filename):
+    """Returns the format of a climate file from its extension, files with other extensions are read
+    as csv as they always were."""
+    filetype = os.path.splitext(filename)[1][1:].lower()
+    if filetype in CLIMATE_FILE_TYPES:
+        return filetype
+    return "csv"
+
+def readClimateSeries(filename, filetype, dt_in, dt_out):
+    """Reads the whole climate file into a ClimateSeries at the output timestep dt_out, see
+    loadClimateFile() for the arguments. Subsets of any length are views of it, see
+    ClimateSeries.getSubSet(). Raises a ValueError for a format not in CLIMATE_FILE_TYPES."""
+    if filetype not in CLIMATE_FILE_TYPES:
+        raise ValueError("Unsupported climate file format '"+str(filetype)+"' of "+str(filename)+
+                         ", expected one of "+", ".join(CLIMATE_FILE_TYPES))
     #New timestep, determine how many lines of old time-step data need to be summed
     if dt_out % dt_in == 0:
         datalines = int(dt_out / dt_in)
     else:
         print "Error: cannot convert climate file timestep from dt-in to dt-out"
         datalines = 1
-    
-    #Grab the data from the file based on the format, returns [Year, Month, Data]
+
+    #Grab the data from the file based on the format, returns arrays of year, month, day, data
     if filetype == "csv":
         #Input Data format: "DD/MM/YYYY HH:MM, rain[mm]\n", skip first line of file
-        data = readFileCSV(filename, datalines)
+        years, months, days, values = readFileCSVArrays(filename, datalines)
     elif filetype == "ixx":
         #Input Data format: "DD.MM.YYYY.hh.mm.ss rain[mm/dt]\n", skip first line of file
-        data = readFileIXX(filename, datalines)
+        years, months, days, values = readFileIXXArrays(filename, datalines)
     elif filetype == "mse":
         #Input Data format: "YY MM DD hh mm ss rain[10E-3mm/dt]\n", skip first line of file
-        data = readFileMSE(filename, datalines)
-    
-    #Narrow down the data to only what the user wants
-    datacut = extractDataSubSet(data, numyears)
-    return datacut
+        years, months, days, values = readFileMSEArrays(filename, datalines)
+    return ClimateSeries(years, months, values)
+
+CLIMATE_CACHE_DIR = "climatecache"     #Sub-folder next to the climate files holding the cached series
+CLIMATE_CACHE_VERSION = 3              #3: entries are validated by the source's size and mtime, md5 only if they differ
+
+def getFileDigest(filename):
+    """Returns the md5 hex digest of the contents of a file, read in blocks of 1MB"""
+    digest = hashlib.md5()
+    f = open(filename, 'rb')
+    block = f.read(1048576)
+    while block:
+        digest.update(block)
+        block = f.read(1048576)
+    f.close()
+    return digest.hexdigest()
+
+def getClimateCachePath(filename, filetype, dt_in, dt_out):
+    """Returns the paths of the cached series (.npy) and its metadata record (.json) and the
+    settings that a cache entry of the climate file must have been built with. Which version of
+    the file an entry holds is checked by isClimateCacheValid()."""
+    settings = {"version": CLIMATE_CACHE_VERSION, "source": os.path.basename(filename),
+                "filetype": filetype, "dt_in": float(dt_in), "dt_out": float(dt_out)}
+    keydigest = hashlib.md5(json.dumps(settings, sort_keys=True).encode("ascii")).hexdigest()
+    cachedir = os.path.join(os.path.dirname(os.path.abspath(filename)), CLIMATE_CACHE_DIR)
+    basename = os.path.splitext(os.path.basename(filename))[0]+"_"+keydigest[:16]
+    return os.path.join(cachedir, basename+".npy"), os.path.join(cachedir, basename+".json"), settings
+
+def isClimateCacheValid(filename, cachedmetadata, settings):
+    """Returns True if the cache metadata record belongs to the settings and to the current contents
+    of the climate file. A matching size and modification time are trusted, the md5 digest of the
+    file is only computed if the size matches but the time does not, e.g. after copying the file."""
+    if cachedmetadata is None or any(cachedmetadata.get(key) != settings[key] for key in settings):
+        return False
+    if cachedmetadata.get("size") != os.path.getsize(filename):
+        return False
+    if cachedmetadata.get("mtime") == os.path.getmtime(filename):
+        return True
+    return cachedmetadata.get("md5") == getFileDigest(filename)
+
+def writeClimateCacheMetadata(metapath, metadata):
+    f = open(metapath, 'w')
+    json.dump(metadata, f, sort_keys=True)
+    f.close()
+
+def loadClimateArray(filename, filetype, dt_in, dt_out):
+    """Cached version of readClimateSeries(), returns the whole series as an (n x 3) array of
+    [year, month, data]. The first call for a file and set of settings parses the file and
+    stores the series as .npy with a .json metadata record in CLIMATE_CACHE_DIR next to the
+    file, later calls memory-map the .npy file, so all processes reading it share its pages.
+    An edited file is parsed again (see isClimateCacheValid()). If the cache cannot be written,
+    the parsed series is returned all the same."""
+    npypath, metapath, settings = getClimateCachePath(filename, filetype, dt_in, dt_out)
+    if os.path.isfile(npypath) and os.path.isfile(metapath):
+        f = open(metapath, 'r')
+        try:
+            cachedmetadata = json.load(f)
+        except ValueError:
+            cachedmetadata = None       #corrupt record, rebuild the entry
+        f.close()
+        if isClimateCacheValid(filename, cachedmetadata, settings):
+            if cachedmetadata["mtime"] != os.path.getmtime(filename):
+                try:        #same contents under a new time, record it so the digest is not needed again
+                    cachedmetadata["mtime"] = os.path.getmtime(filename)
+                    writeClimateCacheMetadata(metapath, cachedmetadata)
+                except (IOError, OSError):
+                    pass
+            return np.load(npypath, mmap_mode='r')
+
+    metadata = dict(settings)
+    metadata["size"] = os.path.getsize(filename)        #taken before parsing, a later edit invalidates the entry
+    metadata["mtime"] = os.path.getmtime(filename)
+    metadata["md5"] = getFileDigest(filename)
+    series = readClimateSeries(filename, filetype, dt_in, dt_out)
+    data = np.column_stack([series.getYears(), series.getMonths(), series.getValues()]).astype(float)
+    try:
+        if not os.path.isdir(os.path.dirname(npypath)):
+            os.makedirs(os.path.dirname(npypath))
+        temppath = npypath+"."+str(os.getpid())+".tmp"
+        f = open(temppath, 'wb')
+        np.save(f, data)
+        f.close()
+        os.rename(temppath, npypath)     #readers never see a half-written file
+        metadata["rows"] = len(data)
+        writeClimateCacheMetadata(metapath, metadata)
+    except (IOError, OSError), e:
+        print "Warning: could not write climate cache "+str(npypath)+" ("+str(e)+")"
+    return data
+
+def loadClimateSeries(filename, filetype, dt_in, dt_out, usecache=True):
+    """Returns the whole climate file as a ClimateSeries, read through the climate series cache
+    (see loadClimateArray()) if 'usecache' is set, parsed from the file otherwise."""
+    if not usecache:
+        return readClimateSeries(filename, filetype, dt_in, dt_out)
+    array = loadClimateArray(filename, filetype, dt_in, dt_out)
+    return ClimateSeries(array[:,0], array[:,1], array[:,2])
+
+CLIMATE_REGISTRY = {}       #Loaded climate series {(path, filetype, dt_in, dt_out) : [mtime, ClimateSeries]}
+CLIMATE_REGISTRY_STATS = {"hits": 0, "misses": 0}
+
+def getClimateSeries(filename, filetype, dt_in, dt_out, numyears, usecache=True):
+    """Returns the first 'numyears' years of the climate file as a ClimateSeries. Each file and
+    set of timesteps is only loaded once per process and the whole series held in CLIMATE_REGISTRY,
+    so all module instances and repeated runs share it, whatever number of years they use. The
+    series is reloaded if the file's modification time has changed since it was read.
+        - filename, filetype, dt_in, dt_out, numyears: see loadClimateFile()
+        - usecache: read through the climate series cache on disk, see loadClimateArray()
+    """
+    key = (os.path.normpath(os.path.abspath(filename)), filetype, float(dt_in), float(dt_out))
+    entry = CLIMATE_REGISTRY.get(key)
+    if entry is not None and os.path.getmtime(key[0]) == entry[0]:
+        CLIMATE_REGISTRY_STATS["hits"] += 1
+        return entry[1].getSubSet(numyears)
+
+    CLIMATE_REGISTRY_STATS["misses"] += 1
+    mtime = os.path.getmtime(key[0])
+    series = loadClimateSeries(filename, filetype, dt_in, dt_out, usecache)
+    CLIMATE_REGISTRY[key] = [mtime, series]
+    return series.getSubSet(numyears)
+
+def getClimateRegistryStats():
+    """Returns the hit/miss counts of the climate registry and the number of series currently held."""
+    return {"hits": CLIMATE_REGISTRY_STATS["hits"], "misses": CLIMATE_REGISTRY_STATS["misses"],
+            "series": len(CLIMATE_REGISTRY)}
+
+def clearClimateRegistry():
+    """Empties the climate registry and resets its statistics."""
+    CLIMATE_REGISTRY.clear()
+    CLIMATE_REGISTRY_STATS["hits"] = 0
+    CLIMATE_REGISTRY_STATS["misses"] = 0
+    return True
 
 def readFileCSV(filename, rescalelines):
     """Read a .csv format data file containing climate data at a given time step.
     Function also calls rescaling function to rescale the data to the desired d_out
-    timestep"""
-    f = open(filename, 'r')         #Open the file containin raindata
-    datavec = []                      #initialize the vector that contains the data [[Date][rain]]
+    timestep. Returns the data in the form [year, month, data], see readFileCSVArrays()"""
+    return convertArraysToList(*readFileCSVArrays(filename, rescalelines))
+
+CLIMATE_INITIAL_ROWS = 4096     #Initial length of the output arrays of aggregateRecords(), doubled when full
+MSE_CENTURY_PIVOT = 50          #Two-digit .mse years below this are 20YY, others 19YY
+
+def readFileCSVArrays(filename, rescalelines):
+    """Streaming reader of a .csv climate file "DD/MM/YYYY HH:MM,value", skips the first line.
+    Returns the arrays of aggregateRecords()."""
+    f = open(filename, 'r')
     f.readline()                        #skip the first line of the file
-    for lines in f:
-        datavec.append(lines)         #Add the subsequent lines to the rain file
+    data = aggregateRecords(iterateCSVRecords(f), rescalelines)
     f.close()
-    for i in range(len(datavec)):
-        datavec[i] = datavec[i].split(",")    #split the line based on the s
-        datavec[i][0] = datavec[i][0].split(" ")
-        datavec[i][1] = datavec[i][1].rstrip("\n")
-        if datavec[i][1] in ['', "0", ""]:
-            datavec[i][1] = "0"
-        datavec[i][1] = float(datavec[i][1])
-    #Transfer rain data into rain[] matrix, pay attention to month and year
-    for i in range(len(datavec)):
-        year, month = convertToYearMonth(datavec[i][0][0], "/", 2)
-        datavec[i] = [year, month, datavec[i][1]]
-    data = rescaleData(datavec, rescalelines)
     return data
 
-def rescaleData(datavec, rescalelines):
-    """Rescale data to current dt_out timestep (using rescalelines). Sum up in groups of
-    #x lines where x = rescalelines"""
+def readFileIXX(filename, rescalelines):
+    """Read a .ixx format data file containing climate data at a given time step and
+    rescale it to the desired dt_out timestep. Returns the data in the form [year, month, data]"""
+    return convertArraysToList(*readFileIXXArrays(filename, rescalelines))
+
+def readFileIXXArrays(filename, rescalelines):
+    """Streaming reader of a .ixx climate file "DD.MM.YYYY.hh.mm.ss value[mm/dt]", skips the
+    first line. The date and time may also be separated by a space. Returns the arrays of
+    aggregateRecords()."""
+    f = open(filename, 'r')
+    f.readline()                        #skip the first line of the file
+    data = aggregateRecords(iterateIXXRecords(f), rescalelines)
+    f.close()
+    return data
+
+def readFileMSE(filename, rescalelines):
+    """Read a .mse format data file containing climate data at a given time step and
+    rescale it to the desired dt_out timestep. Returns the data in the form [year, month, data]"""
+    return convertArraysToList(*readFileMSEArrays(filename, rescalelines))
+
+def readFileMSEArrays(filename, rescalelines):
+    """Streaming reader of a .mse climate file "YY MM DD hh mm ss value[10E-3mm/dt]", skips the
+    first line. Values are converted to [mm/dt]. Returns the arrays of aggregateRecords()."""
+    f = open(filename, 'r')
+    f.readline()                        #skip the first line of the file
+    data = aggregateRecords(iterateMSERecords(f), rescalelines)
+    f.close()
+    return data
+
+def iterateCSVRecords(lines):
+    """Yields ((year, month, day), value) of each "DD/MM/YYYY HH:MM,value" line, empty values are 0"""
+    lastdate = None
+    for line in lines:
+        line = line.split(",", 1)
+        if len(line) < 2:
+            continue        #skip empty lines
+        date = line[0].split(" ", 1)[0]
+        if date != lastdate:            #dates only change once per day, parse them only then
+            lastdate = date
+            day, month, year = date.split("/")
+            datetuple = (int(year), int(month), int(day))
+        value = line[1].strip()
+        if value in ["", "0"]:
+            yield datetuple, 0.0
+        else:
+            yield datetuple, float(value)
+
+def iterateIXXRecords(lines):
+    """Yields ((year, month, day), value) of each "DD.MM.YYYY.hh.mm.ss value" line"""
+    lastdate = None
+    for line in lines:
+        line = line.split()
+        if len(line) < 2:
+            continue        #skip empty lines
+        date = line[0][:10]
+        if date != lastdate:
+            lastdate = date
+            day, month, year = date.split(".")
+            datetuple = (int(year), int(month), int(day))
+        yield datetuple, float(line[-1])
+
+def iterateMSERecords(lines):
+    """Yields ((year, month, day), value [mm]) of each "YY MM DD hh mm ss value[10E-3mm]" line"""
+    lastdate = None
+    for line in lines:
+        line = line.split()
+        if len(line) < 7:
+            continue        #skip empty lines
+        date = line[0:3]
+        if date != lastdate:
+            lastdate = date
+            year, month, day = int(line[0]), int(line[1]), int(line[2])
+            if year < 100:
+                if year < MSE_CENTURY_PIVOT:
+                    year += 2000
+                else:
+                    year += 1900
+            datetuple = (year, month, day)
+        yield datetuple, float(line[6])/1000.0
+
+def aggregateRecords(records, rescalelines):
+    """Sums ((year, month, day), value) records in groups of 'rescalelines' to the output time
+    step on the fly (as rescaleData() does) and writes them into preallocated arrays, so memory
+    only scales with the output length. Each group takes the date of its last record. The record
+    iterators pass the same date tuple object for all records of a day. Returns
+    four arrays of the output length:
+        - years, months: year and month of each output time step
+        - days: day index of each time step, days since the date of the first record
+        - values: the summed data
+    """
+    size = CLIMATE_INITIAL_ROWS
+    years = np.zeros(size, dtype=int)
+    months = np.zeros(size, dtype=int)
+    days = np.zeros(size, dtype=int)
+    values = np.zeros(size)
+
+    rows = 0
     timecounter = 0
-    datasum = 0
-    data = []
-    for i in range(len(datavec)):
-        curyear = datavec[i][0]
-        curmonth = datavec[i][1]
+    datasum = 0.0
+    lastdate = None
+    firstday = None
+    for date, value in records:
+        if date is not lastdate:
+            lastdate = date
+            year, month, day = date
+            dayindex = datetime.date(year, month, day).toordinal()
+            if firstday is None:
+                firstday = dayindex
+            dayindex -= firstday
+        datasum += value
         timecounter += 1
-        datasum += datavec[i][2]
         if timecounter == rescalelines:
-            data.append([curyear, curmonth, datasum])
+            if rows == size:
+                size *= 2
+                years.resize(size, refcheck=False)
+                months.resize(size, refcheck=False)
+                days.resize(size, refcheck=False)
+                values.resize(size, refcheck=False)
+            years[rows] = year
+            months[rows] = month
+            days[rows] = dayindex
+            values[rows] = datasum
+            rows += 1
             timecounter = 0
-            datasum = 0
-    if timecounter != 0:
-        data.append([curyear, curmonth, datasum])
-    datavec = []        #Clear memory
+            datasum = 0.0
+    if timecounter != 0:        #last incomplete group
+        years = np.append(years[:rows], year)
+        months = np.append(months[:rows], month)
+        days = np.append(days[:rows], dayindex)
+        values = np.append(values[:rows], datasum)
+        rows += 1
+    return years[:rows].copy(), months[:rows].copy(), days[:rows].copy(), values[:rows].copy()
+
+def convertArraysToList(years, months, days, values):
+    """Converts the arrays of aggregateRecords() to the list form [year, month, data]"""
+    return map(list, zip(np.asarray(years, dtype=int).tolist(), np.asarray(months, dtype=int).tolist(),
+                         np.asarray(values, dtype=float).tolist()))
+
+class ClimateSeries(object):
+    def __init__(self, years, months, values, yearstarts=None, monthstarts=None):
+        """Columnar time series of [year, month, value] data held in three NumPy arrays. The
+        positions where a new year or a new month starts are found once, so that aggregating
+        and scaling are group-by reductions over these boundaries instead of loops over rows.
+        The year starts also index the series by year, see getYearOffset(). Rows must be in
+        chronological order.
+            - years, months, values: arrays (or lists) of the same length
+            - yearstarts, monthstarts: first row of each year and month if already known, e.g.
+                    for a subset of another series, found from the data otherwise
+        """
+        self.__years = np.asarray(years, dtype=int)
+        self.__months = np.asarray(months, dtype=int)
+        self.__values = np.asarray(values, dtype=float)
+        if yearstarts is None or monthstarts is None:
+            newyear = np.flatnonzero(np.diff(self.__years) != 0) + 1
+            newmonth = np.flatnonzero((np.diff(self.__years) != 0) | (np.diff(self.__months) != 0)) + 1
+            first = np.arange(min(len(self.__values), 1))        #[0], or empty for an empty series
+            yearstarts = np.concatenate([first, newyear]).astype(int)
+            monthstarts = np.concatenate([first, newmonth]).astype(int)
+        self.__yearstarts = yearstarts
+        self.__monthstarts = monthstarts
+        self.__yearoffsets = dict(zip(self.__years[yearstarts].tolist(), yearstarts.tolist()))     #{year : first row}
+
+    def __len__(self):
+        return len(self.__values)
+
+    def getYears(self):
+        return self.__years
+
+    def getMonths(self):
+        return self.__months
+
+    def getValues(self):
+        return self.__values
+
+    def getYearStarts(self):
+        """Returns the index of the first row of each year"""
+        return self.__yearstarts
+
+    def getMonthStarts(self):
+        """Returns the index of the first row of each month"""
+        return self.__monthstarts
+
+    def getYearCount(self):
+        return len(self.__yearstarts)
+
+    def getYearOffset(self, year):
+        """Returns the index of the first row of 'year'. For a year without data, returns the
+        first row of the next year in the series, or the length of the series past its end."""
+        offset = self.__yearoffsets.get(year)
+        if offset is None:
+            nextyear = np.searchsorted(self.__years[self.__yearstarts], year)
+            if nextyear < len(self.__yearstarts):
+                offset = self.__yearstarts[nextyear]
+            else:
+                offset = len(self.__values)
+        return int(offset)
+
+    def getSubSet(self, numyears):
+        """Returns the first 'numyears' years of the series (at least one year), see
+        extractDataSubSet(). The subset is a view of this series' arrays, no data is copied."""
+        if numyears < 1:
+            numyears = 1    #cannot be less than 1
+        if numyears >= self.getYearCount():
+            return self
+        end = self.getYearOffset(self.__years[0] + numyears)
+        yearcount = np.searchsorted(self.__yearstarts, end)
+        monthcount = np.searchsorted(self.__monthstarts, end)
+        return ClimateSeries(self.__years[:end], self.__months[:end], self.__values[:end],
+                             self.__yearstarts[:yearcount], self.__monthstarts[:monthcount])
+
+    def getRescaled(self, rescalelines):
+        """Returns a new series with the values summed in groups of 'rescalelines' rows, each
+        group takes the year and month of its last row, see rescaleData()"""
+        rescalelines = int(rescalelines)
+        starts = np.arange(0, len(self.__values), rescalelines)
+        ends = np.minimum(starts + rescalelines, len(self.__values)) - 1
+        return ClimateSeries(self.__years[ends], self.__months[ends], np.add.reduceat(self.__values, starts))
+
+    def getMonthly(self):
+        """Returns a new series of the monthly sums"""
+        starts = self.__monthstarts
+        return ClimateSeries(self.__years[starts], self.__months[starts], np.add.reduceat(self.__values, starts))
+
+    def getAnnual(self):
+        """Returns the years and annual sums as two arrays"""
+        starts = self.__yearstarts
+        return self.__years[starts], np.add.reduceat(self.__values, starts)
+
+    def getScalingFactors(self):
+        """Returns a new series of the values divided by the sum of their year, e.g. the
+        evaporation scaling factors for demand patterns"""
+        annualsums = self.getAnnual()[1]
+        yearlengths = np.diff(np.concatenate([self.__yearstarts, [len(self.__values)]]))
+        return ClimateSeries(self.__years, self.__months, self.__values / np.repeat(annualsums, yearlengths))
+
+    def toList(self):
+        """Returns the series in the list form [year, month, value]"""
+        return convertArraysToList(self.__years, self.__months, None, self.__values)
+
+def createClimateSeries(data):
+    """Creates a ClimateSeries from data in the list form [year, month, value]"""
+    return ClimateSeries([row[0] for row in data], [row[1] for row in data], [row[2] for row in data])
+
+def rescaleData(datavec, rescalelines):
+    """Rescale data to current dt_out timestep (using rescalelines). Sum up in groups of
+    #x lines where x = rescalelines"""
     #Now we have rescaled data in the matrix data[] stored in the form of [year, month, data]
-    return data
+    return createClimateSeries(datavec).getRescaled(rescalelines).toList()
 
 def convertToYearMonth(datestring, delimiter, yearpos):
     """Input date string 'DD/MM/YYYY' is converted into two output integers: year and month"""
@@ -114,78 +484,28 @@ def convertToYearMonth(datestring, delimiter, yearpos):
 def getYearCount(inputvec):
     """Scans the data vector for unique years to return the total number of years in 
         the time-series """
-    yearitems = []
-    for i in range(len(inputvec)):
-        if inputvec[i][0] not in yearitems:
-            yearitems.append(inputvec[i][0])
-    return len(yearitems)
+    return len(set(row[0] for row in inputvec))
 
 def extractDataSubSet(data, numyears):
     """Scans the data file and returns a time series of length 'numyears' = number of
     years the user wants of the data, if numyears = 0, returns one year only"""
-    years = getYearCount(data)
-    if numyears < 1:
-        numyears = 1    #cannot be less than 1
-    if numyears >= years:        #if time series shorter than what user wants, returns time-series
-        return data
-    startyear = data[0][0]       #get the start year
-    endyear = startyear + numyears   #the year to stop tracking
-    currentyear = startyear     #initialize current year variable
-    datacut = []
-    rowcounter = 0
-    while currentyear != endyear:        
-        datacut.append(data[rowcounter])        #append the data
-        rowcounter += 1                         #increment row counter by one        
-        currentyear = data[rowcounter][0]     #stops once the last line of the end year has been written
-    return datacut
+    return createClimateSeries(data).getSubSet(numyears).toList()
 
 def convertVectorToScalingFactors(inputvec):
     """Converts an input series to a set of scaling factors based on the annual data.
     Used for evaporation factors for example."""
-    annualdata = convertDataToAnnual(inputvec)
-    yeartrack = inputvec[0][0]
-    anndataindex = 0
-    scalefactors = []
-    for i in range(len(inputvec)):
-        curyear = inputvec[i][0]
-        if curyear == yeartrack:
-            scalefactors.append([inputvec[i][0], inputvec[i][1], inputvec[i][2]/annualdata[anndataindex][1]])
-        else:
-            yeartrack = curyear
-            anndataindex += 1
-            scalefactors.append([inputvec[i][0], inputvec[i][1], inputvec[i][2]/annualdata[anndataindex][1]])
-    #scalefactors.append([inputvec[i][0], inputvec[i][1], inputvec[i][2]/annualdata[anndataindex][1]])
-    return scalefactors
+    return createClimateSeries(inputvec).getScalingFactors().toList()
 
 def convertDataToMonthly(data):
     """Converts an input data set to monthly time step"""
-    mdata = []
-    datasum = 0
-    curmonth = data[0][1]
-    for i in range(len(data)):
-        if data[i][1] == curmonth:
-            datasum += data[i][2]
-        else:
-            mdata.append([data[i-1][0], curmonth, datasum])
-            datasum = data[i][2]
-            curmonth = data[i][1]
-    mdata.append([data[i-1][0], curmonth, datasum])
-    return mdata
+    return createClimateSeries(data).getMonthly().toList()
     
 def convertDataToAnnual(data):
     """Converts an input data set to annual time step"""
+    years, annualsums = createClimateSeries(data).getAnnual()
     anndata = []
-    yeartrack = data[0][0]      #initialize to start year
-    datasum = 0
-    for i in range(len(data)):
-        curyear = data[i][0]
-        if curyear == yeartrack:
-            datasum += data[i][2]
-        elif curyear != yeartrack:
-            anndata.append([yeartrack, datasum])
-            datasum = data[i][2] #reinitialize datasum, but set to value of current year
-            yeartrack = curyear
-    anndata.append([yeartrack, datasum])
+    for i in range(len(years)):
+        anndata.append([int(years[i]), float(annualsums[i])])
     return anndata
 
 def convertDataToInflowSeries(data, catchment, includedatestamp):
@@ -234,6 +554,93 @@ def createConstantDataSeries(dailyvalue, timesteps):
         dataseries.append(dailyvalue)
     return dataseries
 
+SERIES_CHUNK_SIZE = 8760    #Default number of time steps per chunk when a series is walked in chunks
+
+class ScaledSeries(object):
+    def __init__(self, base, scale):
+        """View of a time series as a base array times a scalar, e.g. the inflow of a catchment as the
+        rainfall times its area or a demand as the scaling factors times the annual demand. Rescaling,
+        summing and chunking work on the shared base array, the scaled series itself is only built by
+        toArray() and toList().
+            - base: single-dimensional array (or list) of the series at scale 1, arrays are not copied
+            - scale: scalar factor
+        """
+        self.__base = np.asarray(base, dtype=float)
+        self.__scale = float(scale)
+        self.__basesum = None
+
+    def __len__(self):
+        return len(self.__base)
+
+    def getBase(self):
+        return self.__base
+
+    def getScale(self):
+        return self.__scale
+
+    def getScaled(self, factor):
+        """Returns a view of this series times 'factor' on the same base array"""
+        return ScaledSeries(self.__base, self.__scale * factor)
+
+    def sum(self):
+        if self.__basesum is None:
+            self.__basesum = float(self.__base.sum())
+        return self.__basesum * self.__scale
+
+    def iterateChunks(self, chunksize=SERIES_CHUNK_SIZE):
+        """Yields the scaled series as lists of 'chunksize' time steps, the base array is never copied whole"""
+        for start in range(0, len(self.__base), chunksize):
+            yield (self.__base[start:start+chunksize] * self.__scale).tolist()
+
+    def toArray(self):
+        return self.__base * self.__scale
+
+    def toList(self):
+        return self.toArray().tolist()
+
+def getSeriesValues(data):
+    """Returns the values of a data vector [year, month, data] or [data] as an array"""
+    values = np.asarray(data, dtype=float)
+    if values.ndim == 2:
+        values = values[:,2]
+    return values
+
+def createInflowView(data, catchment):
+    """View version of convertDataToInflowSeries() without date stamps, returns a ScaledSeries of the
+    inflow [kL/dt] from 'catchment' [sqm]. Create it once and use getScaled() for other catchments."""
+    return ScaledSeries(getSeriesValues(data), catchment / 1000.0)
+
+def createScaledView(annualvalue, scalingfactors):
+    """View version of createScaledDataSeries() without date stamps, returns a ScaledSeries of the
+    annual value distributed over the time steps by the scaling factors"""
+    return ScaledSeries(getSeriesValues(scalingfactors), annualvalue)
+
+def createConstantView(dailyvalue, timesteps):
+    """View version of createConstantDataSeries(), returns a ScaledSeries of 'timesteps' values of
+    'dailyvalue'. The base is a read-only broadcast of 1.0 that takes no memory per time step."""
+    return ScaledSeries(np.broadcast_to(np.float64(1.0), (int(timesteps),)), dailyvalue)
+
+def sumSeries(series):
+    """Returns the sum of a ScaledSeries or a list of values"""
+    if isinstance(series, ScaledSeries):
+        return series.sum()
+    return sum(series)
+
+def getSeriesList(series):
+    """Returns a ScaledSeries or a list of values as a list"""
+    if isinstance(series, ScaledSeries):
+        return series.toList()
+    return series
+
+def iterateSeriesChunks(series, chunksize=SERIES_CHUNK_SIZE):
+    """Yields a ScaledSeries or a list of values in chunks of 'chunksize' time steps"""
+    if isinstance(series, ScaledSeries):
+        for chunk in series.iterateChunks(chunksize):
+            yield chunk
+    else:
+        for start in range(0, len(series), chunksize):
+            yield series[start:start+chunksize]
+
 def mergeTimeSeries(timeseries1, timeseries2, includedatestamp):
     """Merges two time series of the same time step into a single continuous time series.
     If time steps differ, it will return the longer one
@@ -270,22 +677,15 @@ def mergeTimeSeries(timeseries1, timeseries2, includedatestamp):
     else:
         includedatestamp = False
         
+    #Sum the value columns, the value is always the last entry of a row
+    values1 = np.asarray(timeseries1, dtype=float).reshape(length1, -1)[:,-1]
+    values2 = np.asarray(timeseries2, dtype=float).reshape(length2, -1)[:,-1]
+    timestepsums = (values1 + values2).tolist()
+    if not includedatestamp:
+        return timestepsums
     for i in range(length1):
-        timestepsum = 0
-        if format1 > 1: 
-            timestepsum += timeseries1[i][len(timeseries1[i])-1]
-        else: 
-            timestepsum += timeseries1[i]
-        if format2 > 1: 
-            timestepsum += timeseries2[i][len(timeseries2[i])-1]
-        else: 
-            timestepsum += timeseries2[i]
-                
-        if includedatestamp:
-            merger.append(controltseries[i][0:(len(controltseries[0])-1)])
-            merger[i].append(timestepsum)
-        else:
-            merger.append(timestepsum)
+        merger.append(controltseries[i][0:(len(controltseries[0])-1)])
+        merger[i].append(timestepsums[i])
     return merger
 
 def removeDateStampFromSeries(data):